@@ -30,8 +30,9 @@ def run(case: str) -> str:
 
 def check(have: str, want: str) -> None:
 
-    assert np.isclose(circuit()[0], 0.5), "The state is not correct"
-    assert np.isclose(circuit()[-1], 0.5), "The state is not correct"
+    state = circuit()
+    assert np.isclose(state[0], 0.5), "The state is not correct"
+    assert np.isclose(state[-1], 0.5), "The state is not correct"
 
     for op in circuit.tape.operations:
       assert (isinstance(op, qml.Hadamard) or isinstance(op, qml.T) or isinstance(op, qml.QFT)), f"You can only use Hadamard, T and QFT operators. You are using {op.name}"
@@ -23,13 +23,14 @@ def encode_hermitian(A, wires):
     return qml.exp(qml.Hermitian(A, wires=wires), coeff=1j)
 
 
-def mint_to_lime(A, b):
+def mint_to_lime(A, b, qpe_qubits=10):
     """
     Calculates the optimal mint and lime proportions in the Mojito HHLime twist.
 
     Args
         - A (numpy.tensor): a 2x2 matrix
         - b (numpy.tensor): a length-2 vector
+        - qpe_qubits (int): the number of phase estimation qubits
 
     Returns
         - x (numpy.tensor): the solution to Ax = b
@@ -38,7 +39,6 @@ def mint_to_lime(A, b):
     b_qubits = 1
     b_wires = [0]
 
-    qpe_qubits = 10
     qpe_wires = list(range(b_qubits, b_qubits + qpe_qubits))
 
     ancilla_qubits = 1
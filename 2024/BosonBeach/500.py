@@ -1,9 +1,116 @@
 import json
+import time
 import pennylane as qml
 import pennylane.numpy as np
-"""
-not solved yet
-"""
+
+
+def counter_register_size(k):
+    """Number of wires of a mod-k counter register."""
+    return max(1, (k - 1).bit_length())
+
+
+def counter_labels(k):
+    """
+    Basis states encoding the counter values 0, ..., k-1.
+
+    The values follow the reflected Gray code, so consecutive values differ in a single bit and every
+    step of the increment is one multi-controlled X.
+
+    Args:
+        - k (int): The modulus.
+    Returns:
+        - list(list(int)): The bits of every value, first register wire first.
+    """
+    size = counter_register_size(k)
+    return [[((g ^ (g >> 1)) >> (size - 1 - i)) & 1 for i in range(size)] for g in range(k)]
+
+
+def controlled_increment(k, control, register, work_wires=None):
+    """
+    Adds 1 mod k to the counter register when the control wire is in |1>.
+
+    The k-cycle over the Gray-coded labels is applied as the transpositions (g_{k-2} g_{k-1}), ...,
+    (g_0 g_1), each a single multi-controlled X on the bit where the two labels differ. That is k-1
+    gates with counter_register_size(k) controls each, and unused basis states of the register are
+    left alone.
+
+    Args:
+        - k (int): The modulus.
+        - control (int): The wire holding the bit to count.
+        - register (list): The counter register, of counter_register_size(k) wires.
+        - work_wires (list): Wires in any state that the multi-controlled X gates may borrow when they are
+        decomposed into Toffolis, as they need one from three controls on. They are left unchanged.
+    Returns:
+        - Does not return anything since it is a subcircuit.
+    """
+    labels = counter_labels(k)
+    for j in range(k - 2, -1, -1):
+        flip = next(i for i in range(len(register)) if labels[j][i] != labels[j + 1][i])
+        others = [i for i in range(len(register)) if i != flip]
+        qml.MultiControlledX(
+            wires=[control] + [register[i] for i in others] + [register[flip]],
+            control_values=[1] + [labels[j][i] for i in others],
+            work_wires=work_wires,
+        )
+
+
+def hamming_weight_counter(k, data_wires, register):
+    """
+    Leaves the Hamming weight of the data wires mod k in the counter register, which must start in |0...0>.
+    Each increment borrows another data wire as the work wire of its decomposition.
+
+    Args:
+        - k (int): The modulus.
+        - data_wires (list): The wires whose ones are counted.
+        - register (list): The counter register, of counter_register_size(k) wires.
+    Returns:
+        - Does not return anything since it is a subcircuit.
+    """
+    data_wires = list(data_wires)
+    for i, w in enumerate(data_wires):
+        controlled_increment(k, w, register, work_wires=data_wires[i - 1:i] or data_wires[1:2])
+
+
+def hamming_weights(num_wires):
+    """Hamming weight of every computational basis state of num_wires wires, in PennyLane's wire order."""
+    weights = np.zeros(2 ** num_wires, dtype=int).unwrap()
+    for bit in range(num_wires):
+        weights += (np.arange(2 ** num_wires).unwrap() >> bit) & 1
+    return weights
+
+
+def projected_mass(probs, k, residue=0):
+    """
+    Probability mass on the bitstrings whose Hamming weight is residue mod k.
+
+    Args:
+        - probs (np.array(float)): Computational basis probabilities of the wires checked.
+        - k (int): The modulus.
+        - residue (int): The required weight mod k.
+    Returns:
+        - float: The projected mass.
+    """
+    num_wires = len(probs).bit_length() - 1
+    return float(np.sum(qml.math.unwrap(probs)[hamming_weights(num_wires) % k == residue]))
+
+
+def counter_mass(probs, k, num_data_wires):
+    """
+    Probability mass on the basis states whose counter register holds the Hamming weight of the data mod k.
+
+    Args:
+        - probs (np.array(float)): Probabilities of the data wires followed by the counter register.
+        - k (int): The modulus.
+        - num_data_wires (int): The number of data wires.
+    Returns:
+        - float: The consistent mass, 1 for a correct counter.
+    """
+    size = counter_register_size(k)
+    probs = qml.math.unwrap(probs).reshape(2 ** num_data_wires, 2 ** size)
+    codes = [int("".join(map(str, label)), 2) for label in counter_labels(k)]
+    expected = np.array(codes).unwrap()[hamming_weights(num_data_wires) % k]
+    return float(np.sum(probs[np.arange(2 ** num_data_wires).unwrap(), expected]))
+
 
 def U():
     """
@@ -13,7 +120,80 @@ def U():
 
 
     # Put your code here #
+    data = list(range(10))
+    register, flag = [10, 11], 12
+    m1, m2 = counter_labels(3)[1:]
+
+    hamming_weight_counter(3, data, register)
+
+    # weight 1 mod 3: complementing all ten bits maps w to 10 - w, which is 0 mod 3
+    qml.MultiControlledX(wires=register + [flag], control_values=m1)
+    for w in data:
+        qml.CNOT([flag, w])
+    qml.MultiControlledX(wires=register + [flag], control_values=m1)
+
+    # weight 2 mod 3: 342 such strings but only 341 of weight 0 mod 3, so the first bit is moved into the
+    # flag to keep the map injective. With it set, w - 1 = 1 mod 3 is complemented over all ten bits;
+    # otherwise setting the now empty first bit gives w + 1 = 0 mod 3
+    qml.ctrl(qml.SWAP, control=register, control_values=m2)(wires=[data[0], flag])
+    qml.MultiControlledX(wires=register + [data[0]], control_values=m2)
+    for w in data[1:]:
+        qml.MultiControlledX(wires=register + [flag, w], control_values=m2 + [1])
+
+
+def counter_benchmark(sizes=(10, 20), moduli=(3, 5), seed=0):
+    """
+    Counts the gates of hamming_weight_counter, as multi-controlled X gates and decomposed into CNOTs and
+    single-qubit gates, and checks it exactly on a random product state.
+
+    Args:
+        - sizes (list(int)): The numbers of data wires.
+        - moduli (list(int)): The moduli k.
+        - seed (int): The seed of the random state.
+    Returns:
+        - list(dict): One row per (n, k) with keys "n", "k", "wires", "gates" and "controls", the number and
+        size of the multi-controlled X gates, "decomposed_gates", "cnots" and "t_gates", the counts after
+        decomposition, "seconds" and "counter_mass", the mass of the states whose register matches the
+        data weight mod k.
+    """
+    rng = np.random.default_rng(seed)
+
+    rows = []
+    for n in sizes:
+        angles = rng.uniform(0, np.pi, n)
+        for k in moduli:
+            register = list(range(n, n + counter_register_size(k)))
+            dev = qml.device("lightning.qubit", wires=n + len(register))
+
+            @qml.qnode(dev)
+            def circuit():
+                for w in range(n):
+                    qml.RY(angles[w], wires=w)
+                hamming_weight_counter(k, range(n), register)
+                return qml.probs(wires=range(n + len(register)))
+
+            start = time.perf_counter()
+            probs = circuit()
+            seconds = time.perf_counter() - start
+
+            counter_ops = circuit.tape.operations[n:]
+            decomposed = qml.tape.QuantumScript(counter_ops).expand(
+                depth=10, stop_at=lambda op: op.name == "CNOT" or len(op.wires) == 1
+            ).operations
+            rows.append({
+                "n": n,
+                "k": k,
+                "wires": n + len(register),
+                "gates": len(counter_ops),
+                "controls": len(counter_ops[0].wires) - 1,
+                "decomposed_gates": len(decomposed),
+                "cnots": sum(op.name == "CNOT" for op in decomposed),
+                "t_gates": sum(op.name in ("T", "Adjoint(T)") for op in decomposed),
+                "seconds": seconds,
+                "counter_mass": counter_mass(probs, k, n),
+            })
 
+    return rows
 
 
 # These functions are responsible for testing the solution.
@@ -27,7 +207,8 @@ def check(have: str, want: str) -> None:
     have, want = have, want
     params = np.random.rand(10, 2)
 
-    dev = qml.device("default.qubit", wires=13, shots=1000)
+    # exact probabilities instead of 1000 shots, so any leftover mass is caught
+    dev = qml.device("default.qubit", wires=13)
 
     def generate_phi(params, wires):
         for i in range(len(wires)):
@@ -43,11 +224,9 @@ def check(have: str, want: str) -> None:
     def circuit():
         generate_phi(params, wires=range(10))
         U()
-        return qml.sample(wires=range(10))
+        return qml.probs(wires=range(10))
 
-    shots = circuit()
-    for shot in shots:
-        assert sum(shot) % 3 == 0, "Wrong answer"
+    assert np.isclose(projected_mass(circuit(), 3), 1), "Wrong answer"
 
     for op in circuit.tape.operations:
         assert not isinstance(op, qml.QubitUnitary), "You can't use QubitUnitary"
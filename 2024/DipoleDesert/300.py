@@ -1,6 +1,11 @@
 import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pennylane as qml
 import pennylane.numpy as np
+from numpy.polynomial import Chebyshev
 
 
 # Write any helper functions you need here
@@ -63,6 +68,73 @@ def GHZ_fidelity(noise_param, n_qubits):
     return res
 
 
+def _GHZ_fidelity_row(n_qubits, noise_params):
+    """
+    Computes the fidelities of the noisy GHZ states of one size for a whole batch of noise parameters.
+
+    The ideal state is pure, so the fidelity reduces to tr(rho_ideal rho_noisy), which is linear in
+    rho_noisy. Every DepolarizingChannel is affine in its parameter, hence the fidelity is a polynomial
+    of degree n_qubits - 1 in noise_param. We simulate it on n_qubits Chebyshev nodes only and evaluate
+    the interpolant on the whole batch.
+
+    Args:
+        - n_qubits (int): The number of qubits in the GHZ state.
+        - noise_params (np.array(float)): The noise parameters to evaluate, all in [0, 1].
+    Returns:
+        - (np.array(float)): The fidelities, one per noise parameter.
+        - (float): The wall time in seconds spent on this size.
+    """
+
+    start = time.perf_counter()
+    noise_params = np.asarray(noise_params, dtype=float)
+
+    dev = qml.device('default.mixed', wires=n_qubits)
+    GHZ_QNode = qml.QNode(GHZ_circuit, dev)
+    GHZ_ideal = GHZ_QNode(0, n_qubits)
+
+    def fidelity(p):
+        return np.real(np.sum(GHZ_ideal.T * GHZ_QNode(p, n_qubits)))
+
+    degree = n_qubits - 1
+    if len(noise_params) <= degree + 1:
+        fidelities = np.array([fidelity(p) for p in noise_params])
+    else:
+        nodes = (1 - np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))) / 2
+        interpolant = Chebyshev.fit(nodes, [fidelity(p) for p in nodes], degree, domain=[0, 1])
+        fidelities = interpolant(noise_params)
+
+    return fidelities, time.perf_counter() - start
+
+
+def GHZ_fidelity_sweep(noise_params, n_qubits_list, max_workers=None):
+    """
+    Calculates GHZ_fidelity over the grid noise_params x n_qubits_list. Each GHZ size is handled by one
+    worker of a process pool, which builds a single device and QNode, computes the ideal state once and
+    evaluates all the noise parameters as a batch.
+
+    Args:
+        - noise_params (np.array(float)): The noise parameters of the depolarizing channels.
+        - n_qubits_list (list(int)): The numbers of qubits in the GHZ states.
+        - max_workers (int): The size of the process pool. Defaults to the number of CPUs.
+    Returns:
+        - (list(dict)): One row per (n, p) pair with keys "n", "p", "fidelity" and "runtime", where
+        runtime is the wall time of that size amortised over its noise parameters.
+    """
+
+    noise_params = np.asarray(noise_params, dtype=float)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(_GHZ_fidelity_row, n_qubits_list, repeat(noise_params))
+
+        table = []
+        for n_qubits, (fidelities, runtime) in zip(n_qubits_list, results):
+            for p, fid in zip(noise_params, fidelities):
+                table.append({"n": int(n_qubits), "p": float(p), "fidelity": float(fid),
+                              "runtime": runtime / len(noise_params)})
+
+    return table
+
+
 # These functions are responsible for testing the solution.
 
 def run(test_case_input: str) -> str:
@@ -76,11 +148,9 @@ def check(solution_output: str, expected_output: str) -> None:
     solution_output = json.loads(solution_output)
     expected_output = json.loads(expected_output)
 
-    dev = qml.device('default.mixed', wires=4)
-    qnode = qml.QNode(GHZ_circuit, dev)
-    u = qnode(0.05, 3)
+    tape = qml.tape.make_qscript(GHZ_circuit)(0.05, 3)
 
-    for op in qnode.tape.operations:
+    for op in tape.operations:
         assert (isinstance(op, qml.RX) or isinstance(op, qml.RY) or isinstance(op, qml.CZ) or isinstance(op,
                                                                                                          qml.DepolarizingChannel)), "You are using forbidden gates!"
 
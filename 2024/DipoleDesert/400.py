@@ -8,22 +8,16 @@ import pennylane.numpy as np
 dev = qml.device('default.qubit', wires=[0, 1, 2])
 
 
-@qml.qnode(dev)
-def cloning_machine(coefficients, wire):
+def cloning_circuit(coefficients):
     """
-    Returns the reduced density matrix on a wire for the cloning machine circuit.
+    Applies the cloning machine circuit: prepares the input state on the middle and bottom wires
+    and clones the state of the top wire.
 
     Args:
         - coefficients (np.array(float)): an array [c0,c1] containing the coefficients parametrizing
         the input state fed into the middle and bottom wires of the cloning machine.
-        wire (int): The wire on which we calculate the reduced density matrix.
-
-    Returns:
-        - np.tensor(complex): The reduced density matrix on wire = wire, as returned by qml.density_matrix.
-
     """
 
-    # Put your code here
     coefficients = coefficients / np.sqrt(2)
     c0 = coefficients[0]
     c1 = coefficients[1]
@@ -45,11 +39,111 @@ def cloning_machine(coefficients, wire):
     qml.CNOT([1, 0])
     qml.CNOT([2, 0])
 
+
+def reduced_density_matrices(state, wires, pairs=(), wire_order=None):
+    """
+    Computes several reduced density matrices of a pure state with one partial trace each.
+
+    Args:
+        - state (np.tensor(complex)): a statevector of shape (2**n,), as returned by qml.state.
+        It may also have leading batch dimensions.
+        - wires (list): The wires on which we calculate the single-wire reduced density matrices.
+        - pairs (list(list)): Pairs of wires on which we calculate the two-wire reduced density matrices.
+        - wire_order (list): The wire labels of the state. Defaults to range(n).
+
+    Returns:
+        - (list(np.tensor(complex))): The 2x2 reduced density matrices on wires, followed by the 4x4
+        reduced density matrices on pairs, in the order given.
+    """
+
+    dim = qml.math.shape(state)[-1]
+    batch_shape = tuple(qml.math.shape(state)[:-1])
+    num_wires = int(np.log2(dim))
+    wire_order = list(range(num_wires)) if wire_order is None else list(wire_order)
+    psi = qml.math.reshape(state, batch_shape + (2,) * num_wires)
+
+    ket = "abcdefghijklmnopqrstuvw"[:num_wires]
+    out = []
+    for kept in [[w] for w in wires] + [list(p) for p in pairs]:
+        positions = [wire_order.index(w) for w in kept]
+        bra = list(ket)
+        for i, pos in enumerate(positions):
+            bra[pos] = "XYZ"[i]
+        kept_ket = "".join(ket[pos] for pos in positions)
+        kept_bra = "".join(bra[pos] for pos in positions)
+        rho = qml.math.einsum(f"...{ket},...{''.join(bra)}->...{kept_ket}{kept_bra}", psi, qml.math.conj(psi))
+        size = 2 ** len(kept)
+        out.append(qml.math.reshape(rho, batch_shape + (size, size)))
+
+    return out
+
+
+@qml.qnode(dev)
+def cloning_machine(coefficients, wire):
+    """
+    Returns the reduced density matrix on a wire for the cloning machine circuit.
+
+    Args:
+        - coefficients (np.array(float)): an array [c0,c1] containing the coefficients parametrizing
+        the input state fed into the middle and bottom wires of the cloning machine.
+        wire (int): The wire on which we calculate the reduced density matrix.
+
+    Returns:
+        - np.tensor(complex): The reduced density matrix on wire = wire, as returned by qml.density_matrix.
+
+    """
+
+    # Put your code here
+    cloning_circuit(coefficients)
+
     return qml.density_matrix(wire)
 
     # Return the reduced density matrix
 
 
+@qml.qnode(dev)
+def cloning_machine_state(coefficients):
+    """
+    Returns the full output state of the cloning machine circuit, from which every reduced
+    density matrix can be obtained without running the circuit again.
+
+    Args:
+        - coefficients (np.array(float)): an array [c0,c1] containing the coefficients parametrizing
+        the input state fed into the middle and bottom wires of the cloning machine.
+
+    Returns:
+        - np.tensor(complex): The output statevector, as returned by qml.state.
+    """
+
+    cloning_circuit(coefficients)
+
+    return qml.state()
+
+
+def marginal_fidelities(coefficients, target, wires, pairs=()):
+    """
+    Calculates the fidelities between the reduced states of the cloning machine and a target state,
+    executing the circuit only once.
+
+    Args:
+        - coefficients (np.array(float)): an array [c0,c1] containing the coefficients parametrizing
+        the input state fed into the middle and bottom wires of the cloning machine.
+        - target (np.array(complex)): The density matrix to compare with. A 2x2 matrix is used for the
+        single wires and its tensor square for the pairs.
+        - wires (list): The wires whose reduced states are compared with target.
+        - pairs (list(list)): Pairs of wires whose reduced states are compared with target x target.
+
+    Returns:
+        - (np.array(float)): The fidelities for wires, followed by the ones for pairs.
+    """
+
+    state = cloning_machine_state(coefficients)
+    rhos = reduced_density_matrices(state, wires, pairs, wire_order=dev.wires.tolist())
+    targets = [target] * len(wires) + [np.kron(target, target)] * len(pairs)
+
+    return np.array([qml.math.fidelity(rho, t) for rho, t in zip(rhos, targets)])
+
+
 def fidelity(coefficients):
     """
     Calculates the fidelities between the reduced density matrices in wires 0 and 1 and the input state |0>.
@@ -64,16 +158,10 @@ def fidelity(coefficients):
     """
 
     # Put your code here
-    # find density matrix at wire 0 and 1
-    Wire0 = cloning_machine(coefficients, wire=0)
-    Wire1 = cloning_machine(coefficients, wire=1)
     # density matrix for state 0
     state0 = np.array([[1.0, 0.0], [0.0, 0.0]])
-    # find fidelity beetween wire 0 and 1 and state 1
-    res = []
-    res.append(qml.math.fidelity(Wire0, state0))
-    res.append(qml.math.fidelity(Wire1, state0))
-    return np.array(res)
+    # find fidelity beetween wire 0 and 1 and state 0 from a single execution
+    return marginal_fidelities(coefficients, state0, wires=[0, 1])
 
 
 # These functions are responsible for testing the solution.
@@ -89,8 +177,8 @@ def run(test_case_input: str) -> str:
 def check(solution_output: str, expected_output: str) -> None:
     solution_output = json.loads(solution_output)
     expected_output = json.loads(expected_output)
-    u = cloning_machine([1 / np.sqrt(3), 1 / np.sqrt(3)], 1)
-    for op in cloning_machine.tape.operations:
+    tape = qml.tape.make_qscript(cloning_machine.func)([1 / np.sqrt(3), 1 / np.sqrt(3)], 1)
+    for op in tape.operations:
         assert (isinstance(op, qml.RX) or isinstance(op, qml.RY) or isinstance(op,
                                                                                qml.CNOT)), "You are using forbidden gates!"
     assert np.allclose(solution_output, expected_output, atol=1e-4), "Not the correct fidelities"
@@ -1,12 +1,43 @@
+import collections
 import functools
 import json
+import time
 import pennylane as qml
 import pennylane.numpy as np
 
-stack_last = functools.partial(qml.math.stack, axis=-1)
-
 Operation = qml.operation.Operation
 
+# basis matrices used to assemble the matrices of the custom ops in a single broadcastable expression,
+# unwrapped to plain NumPy so that they combine with autograd boxes in any order
+_FSIM_ONE = qml.math.unwrap(np.diag([1, 0, 0, 0]).astype(complex))
+_FSIM_COS = qml.math.unwrap(np.diag([0, 1, 1, 0]).astype(complex))
+_FSIM_SIN = qml.math.unwrap(-1j * np.array([[0, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 0]]))
+_FSIM_PHASE = qml.math.unwrap(np.diag([0, 0, 0, 1]).astype(complex))
+
+# Z0 Z3 + Z1 Z2 on the computational basis of the four Wormhole wires
+_WORMHOLE_ZZ = qml.math.unwrap(np.array([(-1) ** (b[0] + b[3]) + (-1) ** (b[1] + b[2]) for b in np.ndindex(2, 2, 2, 2)]))
+_WORMHOLE_EYE = qml.math.unwrap(np.eye(16))
+
+def _is_constant(*params):
+    """Checks whether the parameters are plain, non-trainable scalars whose matrix can be cached."""
+    return all(
+        qml.math.get_interface(p) in ("numpy", "autograd") and not qml.math.requires_grad(p) and qml.math.ndim(p) == 0
+        for p in params
+    )
+
+
+def _frozen(matrix):
+    matrix.setflags(write=False)
+    return matrix
+
+
+def _expand_param(p):
+    """Adds two trailing axes to a (possibly batched) parameter so it scales (..., n, n) matrices."""
+    if isinstance(p, np.tensor):
+        # untraced PennyLane tensors are constants, and they do not add up with autograd boxes
+        p = p.unwrap()
+    return qml.math.reshape(p, qml.math.shape(p) + (1, 1))
+
 
 class fSim(Operation):
     num_params = 2
@@ -15,25 +46,36 @@ class fSim(Operation):
 
     ndim_params = (0, 0)
 
-    # grad_method = "A"
-    # parameter_frequencies = [(1,), (1,)]
+    # theta generates exp(-i theta (XX + YY) / 2), with eigenvalues {-1, 0, 0, 1},
+    # and phi generates exp(-i phi |11><11|), with eigenvalues {0, 0, 0, 1}
+    grad_method = "A"
+    parameter_frequencies = [(1.0, 2.0), (1.0,)]
 
     def __init__(self, theta, phi, wires, id=None):
         super().__init__(theta, phi, wires=wires, id=id)
 
     @staticmethod
-    def compute_matrix(theta, phi):
-        c = qml.math.cos(theta)
-        s = qml.math.sin(theta)
+    @functools.lru_cache(maxsize=128)
+    def _constant_matrix(theta, phi):
+        return _frozen(fSim._batched_matrix(theta, phi))
 
-        one = qml.math.ones_like(phi)
-        c = c * one
-        s = s * one
+    @staticmethod
+    def _batched_matrix(theta, phi):
+        c = _expand_param(qml.math.cos(theta))
+        s = _expand_param(qml.math.sin(theta))
+        e = _expand_param(qml.math.exp(-1j * phi))
+        return _FSIM_ONE + c * _FSIM_COS + s * _FSIM_SIN + e * _FSIM_PHASE
 
-        mat = [[1, 0, 0, 0],
-               [0, c, -1j * s, 0], [0, -1j * s, c, 0], [0, 0, 0, qml.math.exp(-1j * phi)]]
+    @staticmethod
+    def compute_matrix(theta, phi):
+        if _is_constant(theta, phi):
+            return fSim._constant_matrix(float(theta), float(phi))
+        return fSim._batched_matrix(theta, phi)
 
-        return qml.math.stack([stack_last(row) for row in mat], axis=-2)
+    @staticmethod
+    def compute_decomposition(theta, phi, wires):
+        # single-parameter gates with generators, so that adjoint differentiation can handle fSim
+        return [qml.IsingXY(-2 * theta, wires=wires), qml.ControlledPhaseShift(-phi, wires=wires)]
 
 
 class SQRTX(Operation):
@@ -43,6 +85,10 @@ class SQRTX(Operation):
     def __init__(self, wires, id=None):
         super().__init__(wires=wires, id=id)
 
+    @staticmethod
+    def compute_matrix():
+        return _SQRTX_MATRIX
+
     @staticmethod
     def compute_decomposition(wires):
         return [qml.RX(np.pi / 2, wires=wires)]
@@ -55,18 +101,53 @@ class SQRTY(Operation):
     def __init__(self, wires, id=None):
         super().__init__(wires=wires, id=id)
 
+    @staticmethod
+    def compute_matrix():
+        return _SQRTY_MATRIX
+
     @staticmethod
     def compute_decomposition(wires):
         return [qml.RY(np.pi / 2, wires=wires)]
 
 
+_SQRTX_MATRIX = _frozen(qml.RX.compute_matrix(np.pi / 2))
+_SQRTY_MATRIX = _frozen(qml.RY.compute_matrix(np.pi / 2))
+
+
 class Wormhole(Operation):
     num_params = 1
     num_wires = 4
 
+    ndim_params = (0,)
+
+    # Wormhole(g) = exp(i g G) with generator G = (Z0 Z3 + Z1 Z2) / 2, whose eigenvalues are {-1, 0, 1}
+    grad_method = "A"
+    parameter_frequencies = [(1.0, 2.0)]
+
     def __init__(self, g, wires, id=None):
         super().__init__(g, wires=wires, id=id)
 
+    def generator(self):
+        w = self.wires
+        return qml.Hamiltonian([0.5, 0.5], [qml.PauliZ(w[0]) @ qml.PauliZ(w[3]), qml.PauliZ(w[1]) @ qml.PauliZ(w[2])])
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _constant_matrix(g):
+        return _frozen(Wormhole._batched_matrix(g))
+
+    @staticmethod
+    def _batched_matrix(g):
+        # IsingZZ(-g) on (0, 3) and (1, 2) is the diagonal exp(i g / 2 (Z0 Z3 + Z1 Z2))
+        diag = qml.math.exp(0.5j * _expand_param(g)[..., 0] * _WORMHOLE_ZZ)
+        return qml.math.expand_dims(diag, -1) * _WORMHOLE_EYE
+
+    @staticmethod
+    def compute_matrix(g):
+        if _is_constant(g):
+            return Wormhole._constant_matrix(float(g))
+        return Wormhole._batched_matrix(g)
+
     @staticmethod
     def compute_decomposition(g, wires):
         return [qml.IsingZZ(-g, wires=[wires[0], wires[3]]), qml.IsingZZ(-g, wires=[wires[1], wires[2]])]
@@ -120,9 +201,234 @@ def U(wires):
         SQRTX(wires[i])
 
 
+def _is_identity(matrix, atol):
+    """Checks whether a matrix is the identity up to a global phase."""
+    phase = matrix[0, 0]
+    return np.isclose(np.abs(phase), 1, atol=atol) and np.allclose(matrix, phase * np.eye(len(matrix)), atol=atol)
+
+
+_fused_block_cache = {}
+
+
+def _param_key(p):
+    """Exact, hashable form of a constant parameter of any shape."""
+    p = qml.math.toarray(p)
+    return p.dtype.str, p.shape, p.tobytes()
+
+
+def _fused_block(block, atol):
+    """Turns a block of constant one- and two-qubit gates into the cheapest equivalent list of ops."""
+    wires = block["wires"]
+    ops = block["ops"]
+
+    key = (atol, tuple(wires), tuple((op.name, tuple(op.wires), tuple(map(_param_key, op.data))) for op in ops))
+    if key not in _fused_block_cache:
+        _fused_block_cache[key] = _fuse_ops(ops, wires, atol)
+    return _fused_block_cache[key]
+
+
+def _fuse_ops(ops, wires, atol):
+    """Multiplies a list of constant gates acting on wires, see _fused_block."""
+
+    if len(ops) == 1 and isinstance(ops[0], fSim):
+        theta, phi = ops[0].data
+        if np.isclose(theta, 0, atol=atol) and np.isclose(phi, np.pi, atol=atol):
+            # fSim(0, pi) is a CZ, which the simulator applies as a diagonal
+            return [qml.CZ(wires=ops[0].wires)]
+
+    # plain NumPy, so that the fused gates are constants rather than trainable PennyLane tensors
+    matrix = qml.math.unwrap(np.eye(2 ** len(wires), dtype=complex))
+    for op in ops:
+        matrix = qml.math.unwrap(qml.matrix(op, wire_order=wires)) @ matrix
+
+    if _is_identity(matrix, atol):
+        return []
+    if len(ops) == 1:
+        return ops
+    if np.allclose(matrix, np.diag(np.diag(matrix)), atol=atol):
+        return [qml.DiagonalQubitUnitary(np.diag(matrix), wires=wires)]
+    return [qml.QubitUnitary(matrix, wires=wires)]
+
+
+@qml.transform
+def fuse_native_gates(tape, atol=1e-8):
+    """Fuses the constant SQRTX, SQRTY and fSim gates of a tape.
+
+    Consecutive single-qubit gates on a wire are multiplied into one 2x2 unitary, and they are
+    absorbed together with the two-qubit gates they surround into one 4x4 unitary per run of
+    gates on the same pair of wires. Lone fSim(0, pi) gates become CZ, diagonal blocks become
+    DiagonalQubitUnitary and identities (up to a global phase) are dropped. Gates on more than two
+    wires or with trainable or broadcast parameters, like Wormhole, are left untouched and act as barriers.
+
+    Args:
+        tape (QuantumTape): The circuit to optimise.
+        atol (float): Tolerance used to recognise CZ, diagonal and identity blocks.
+
+    Returns:
+        (list(QuantumTape), function): The fused tape and the postprocessing function.
+    """
+    items = []
+    open_blocks = {}
+
+    def close(block):
+        for w in block["wires"]:
+            if open_blocks.get(w) is block:
+                del open_blocks[w]
+
+    for op in tape.operations:
+        trainable = any(qml.math.requires_grad(p) for p in op.data)
+        batched = op.batch_size is not None
+        if len(op.wires) > 2 or trainable or batched or not op.has_matrix and not op.has_decomposition:
+            for w in op.wires:
+                if w in open_blocks:
+                    close(open_blocks[w])
+            items.append(op)
+            continue
+
+        if len(op.wires) == 1:
+            block = open_blocks.get(op.wires[0])
+            if block is None:
+                block = {"wires": op.wires.tolist(), "ops": []}
+                items.append(block)
+                open_blocks[op.wires[0]] = block
+            block["ops"].append(op)
+            continue
+
+        a, b = op.wires
+        block = open_blocks.get(a)
+        if block is not None and block is open_blocks.get(b) and len(block["wires"]) == 2:
+            block["ops"].append(op)
+            continue
+
+        # absorb the pending single-qubit gates of both wires into a new two-qubit block
+        absorbed = []
+        for w in (a, b):
+            pending = open_blocks.get(w)
+            if pending is None:
+                continue
+            close(pending)
+            if len(pending["wires"]) == 1:
+                # blocks with equal contents compare equal, so find this one by identity
+                del items[next(i for i, item in enumerate(items) if item is pending)]
+                absorbed += pending["ops"]
+
+        block = {"wires": [a, b], "ops": absorbed + [op]}
+        items.append(block)
+        open_blocks[a] = open_blocks[b] = block
+
+    new_ops = []
+    for item in items:
+        new_ops += _fused_block(item, atol) if isinstance(item, dict) else [item]
+
+    new_tape = type(tape)(new_ops, tape.measurements, shots=tape.shots)
+
+    def null_postprocessing(results):
+        return results[0]
+
+    return [new_tape], null_postprocessing
+
+
+# prefix states are full 2^n vectors, so only the most recently used ones are kept
+PREFIX_CACHE_SIZE = 16
+_prefix_state_cache = collections.OrderedDict()
+_last_op_keys = {}
+
+
+def _op_key(op):
+    """Exact key of a constant operation: op.hash for the name, wires and hyperparameters, plus the
+    bytes of the parameters, since op.hash prints them and NumPy summarises large arrays."""
+    return op.hash, tuple(map(_param_key, op.data))
+
+
+@qml.transform
+def checkpoint_prefix(tape):
+    """Resumes the simulation of a tape from a cached state after its parameter-independent prefix.
+
+    The prefix is found by structure rather than by trainability, so that a sweep over plain
+    floats is checkpointed too: it is the longest leading run of operations shared with the
+    previous tape on the same wires, cut before the first trainable operation. Its output state is
+    computed once on default.qubit and cached under the exact keys of the prefix operations; the tape
+    is then replaced by a StatePrep of that state followed by the remaining operations. A sweep
+    therefore costs one full tape, one prefix and one suffix per point. Combined with fusion, as in
+    fuse_native_gates(checkpoint_prefix(qnode)), only the suffix is fused.
+
+    Args:
+        tape (QuantumTape): The circuit to checkpoint.
+
+    Returns:
+        (list(QuantumTape), function): The resumed tape and the postprocessing function.
+    """
+
+    def null_postprocessing(results):
+        return results[0]
+
+    ops = tape.operations
+    wire_order = tuple(tape.wires.tolist())
+    trainable = next((i for i, op in enumerate(ops) if any(qml.math.requires_grad(p) for p in op.data)), len(ops))
+    # the prefix never reaches past the first trainable operation, so only constants need keys
+    keys = tuple(_op_key(op) for op in ops[:trainable])
+
+    key = max(
+        (k for k in _prefix_state_cache if k[0] == wire_order and keys[:len(k[1])] == k[1]),
+        key=lambda k: len(k[1]),
+        default=None,
+    )
+    if key is None:
+        previous = _last_op_keys.get(wire_order, ())
+        _last_op_keys[wire_order] = keys
+        split = next((i for i, (a, b) in enumerate(zip(keys, previous)) if a != b), min(len(keys), len(previous)))
+        if split == 0 or split == len(ops):
+            return [tape], null_postprocessing
+
+        key = (wire_order, keys[:split])
+        prefix = qml.tape.QuantumScript(ops[:split], [qml.state()])
+        [_prefix_state_cache[key]] = qml.execute([prefix], qml.device('default.qubit', wires=list(wire_order)))
+        if len(_prefix_state_cache) > PREFIX_CACHE_SIZE:
+            _prefix_state_cache.popitem(last=False)
+
+    _prefix_state_cache.move_to_end(key)
+    split = len(key[1])
+    resumed_ops = [qml.StatePrep(_prefix_state_cache[key], wires=list(wire_order))] + ops[split:]
+    new_tape = type(tape)(resumed_ops, tape.measurements, shots=tape.shots)
+
+    return [new_tape], null_postprocessing
+
+
+@qml.transform
+def expand_fsim(tape):
+    """Decomposes every fSim of a tape with trainable parameters into IsingXY and ControlledPhaseShift.
+
+    The adjoint Jacobian of default.qubit only keeps track of single-parameter gates, so the
+    constant fSim(0, pi) gates shift the index of every trainable parameter before them and the
+    gradient silently comes out wrong. This transform leaves only single-parameter gates on tapes
+    that can be differentiated, and it is applied to wormhole_teleportation; a new QNode built
+    from wormhole_teleportation.func needs it too when it uses diff_method="adjoint".
+
+    Args:
+        tape (QuantumTape): The circuit to expand.
+
+    Returns:
+        (list(QuantumTape), function): The expanded tape and the postprocessing function.
+    """
+    def null_postprocessing(results):
+        return results[0]
+
+    if not tape.trainable_params:
+        return [tape], null_postprocessing
+
+    new_ops = []
+    for op in tape.operations:
+        new_ops += op.decomposition() if isinstance(op, fSim) else [op]
+
+    new_tape = type(tape)(new_ops, tape.measurements, shots=tape.shots)
+
+    return [new_tape], null_postprocessing
+
+
 dev = qml.device('default.qubit', wires=range(7))
 
 
+@expand_fsim
 @qml.qnode(dev)
 def wormhole_teleportation(g):
     """ This function implements the wormhole-inspired teleporation protocol
@@ -163,6 +469,51 @@ def wormhole_teleportation(g):
     return qml.expval(qml.PauliZ(5))
 
 
+def compare_gradients(g, repeats=5):
+    """ Differentiates wormhole_teleportation with respect to g with every supported
+    combination of device and diff_method.
+
+    Args:
+        g (float): Parameter for the Wormhole gate at which the gradient is taken.
+        repeats (int): Number of timed gradient evaluations per method.
+
+    Returns:
+        (list(dict)): One row per method with keys "device", "diff_method", "grad",
+        "error" (absolute difference with the backprop gradient) and "seconds" (mean wall time).
+    """
+
+    methods = [
+        ('default.qubit', 'finite-diff'),
+        ('default.qubit', 'parameter-shift'),
+        ('default.qubit', 'backprop'),
+        ('default.qubit', 'adjoint'),
+        ('lightning.qubit', 'finite-diff'),
+        ('lightning.qubit', 'parameter-shift'),
+        ('lightning.qubit', 'adjoint'),
+    ]
+    g = np.array(g, requires_grad=True)
+
+    rows = []
+    for device_name, diff_method in methods:
+        qnode = qml.QNode(wormhole_teleportation.func, qml.device(device_name, wires=range(7)), diff_method=diff_method)
+        qnode = expand_fsim(qnode)
+        grad_fn = qml.grad(qnode)
+        grad = grad_fn(g)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            grad_fn(g)
+        seconds = (time.perf_counter() - start) / repeats
+
+        rows.append({"device": device_name, "diff_method": diff_method, "grad": float(grad), "seconds": seconds})
+
+    reference = next(row["grad"] for row in rows if row["diff_method"] == 'backprop')
+    for row in rows:
+        row["error"] = abs(row["grad"] - reference)
+
+    return rows
+
+
 # These functions are responsible for testing the solution.
 
 
@@ -177,8 +528,7 @@ def check(solution_output: str, expected_output: str) -> None:
     solution_output = json.loads(solution_output)
     expected_output = json.loads(expected_output)
 
-    u = wormhole_teleportation(np.pi / 4)
-    tape = wormhole_teleportation.qtape
+    tape = qml.tape.make_qscript(wormhole_teleportation.func)(np.pi / 4)
     names = [op.name for op in tape.operations]
 
     assert names.count('Wormhole') == 1, "Can't use Wormhole gate more than once"
@@ -29,28 +29,54 @@ def or_circuit(state):
     return qml.state()
 
 
+def most_likely_bitstrings(values):
+    """
+    Decodes statevectors or probability vectors into their most likely computational basis states.
+
+    Args:
+        - values (np.array): A state or probability vector of length 2**n, or a batch of them along
+        the leading axes.
+    Returns:
+        - np.array(int): The bits of the most likely basis state, most significant (first wire) first,
+        with shape values.shape[:-1] + (n,).
+    """
+    values = qml.math.unwrap(values)
+    num_wires = values.shape[-1].bit_length() - 1
+
+    # the largest amplitude magnitude and the largest probability pick out the same basis state
+    index = np.argmax(np.abs(values), axis=-1)
+    shifts = np.arange(num_wires - 1, -1, -1)
+
+    return (index[..., None] >> shifts) & 1
+
+
+# the tape of the latest or_circuit execution in run(), inspected again by check()
+_last_tape = None
+
+
 # These functions are responsible for testing the solution.
 
 def run(test_case_input: str) -> str:
+    global _last_tape
     ins = json.loads(test_case_input)
-    state = np.real(or_circuit(ins))
-
-    bin_string = bin(np.sum([int((state[i] * i).numpy()) for i in range(len(state))]))[2:].zfill(3)
+    state = or_circuit(ins)
+    _last_tape = or_circuit.tape
 
-    return str([int(elem) for elem in bin_string])
+    return str(most_likely_bitstrings(state).tolist())
 
 
 def check(solution_output: str, expected_output: str) -> None:
     solution_output = json.loads(solution_output)
     expected_output = json.loads(expected_output)
 
-    u = or_circuit([0, 0, 0])
-    tape = or_circuit.qtape
+    tape = _last_tape
+    if tape is None:
+        tape = qml.tape.make_qscript(or_circuit.func)([0, 0, 0])
     names = [op.name for op in tape.operations]
 
     assert names.count('BasisState') == 1, "You can't use BasisState, only the one in the template is allowed"
 
-    for op in or_circuit.tape.operations:
+    for op in tape.operations:
         (isinstance(op, qml.BasisState) or isinstance(op, qml.Toffoli) or isinstance(op,
                                                                                      qml.PauliX)), "You can only use Toffoli and PauliX gates"
 
@@ -8,15 +8,50 @@ def beam_splitter(r):
     Returns the beam splitter matrix.
 
     Args:
-        - r (float): The reflection coefficient of the beam splitter.
+        - r (float or np.array(float)): The reflection coefficient of the beam splitter,
+        or an array of them.
     Returns:
         - (np.array): 2 x 2 matrix that represents the beam
-        splitter matrix.
+        splitter matrix, with the shape of r prepended if r is an array.
     """
 
     # Put your code here
+    r = np.asarray(r)
     t = np.sqrt(1 - r ** 2)
-    return np.array([[r - 1j * t ** 2, t * r], [t * r, -(r + 1j * t ** 2)]])
+    rows = [np.stack([r - 1j * t ** 2, t * r], axis=-1), np.stack([t * r, -(r + 1j * t ** 2)], axis=-1)]
+    return np.stack(rows, axis=-2)
+
+
+def interferometer_matrix(reflections):
+    """
+    Chains beam splitters into a multi-stage interferometer.
+
+    Args:
+        - reflections (list): The reflection coefficient of every stage, in the order the photon
+        meets them. Each entry is a float or an array, and arrays are broadcast against each other.
+    Returns:
+        - (np.array): The 2 x 2 matrix of the whole interferometer, with the broadcast shape of the
+        reflection coefficients prepended.
+    """
+    matrix = np.eye(2)
+    for r in reflections:
+        # later stages multiply from the left
+        matrix = np.einsum("...ij,...jk->...ik", beam_splitter(r), matrix)
+
+    return matrix
+
+
+def interferometer_probabilities(reflections):
+    """
+    Closed-form detection probabilities of a photon entering a multi-stage interferometer in
+    the first port, computed without simulating a circuit.
+
+    Args:
+        - reflections (list): The reflection coefficient of every stage, as in interferometer_matrix.
+    Returns:
+        - np.array(float): The probabilities of the two output ports, with shape (..., 2).
+    """
+    return np.abs(interferometer_matrix(reflections)[..., :, 0]) ** 2
 
 
 dev = qml.device('default.qubit')
@@ -29,11 +64,13 @@ def mz_interferometer(r):
     detect a photon, and the probability that D detects a photon.
 
     Args:
-        - r (float): The reflection coefficient of the beam splitters.
+        - r (float or np.array(float)): The reflection coefficient of the beam splitters,
+        or a vector of them to sweep in a single broadcast execution.
     Returns:
         - np.array(float): An array of shape (2,), where the first
         element is the probability of detection at A or C,
         and the second element is the probability of detection at D.
+        A vector of r gives shape (len(r), 2).
     """
 
     # Put your code here
@@ -41,8 +78,6 @@ def mz_interferometer(r):
     qml.QubitUnitary(matrix, wires=0)
     return qml.probs([0])
 
-    return qml.probs([0])
-
 
 # These functions are responsible for testing the solution.
 
@@ -1,4 +1,5 @@
 import json
+import time
 import pennylane as qml
 import pennylane.numpy as np
 
@@ -6,33 +7,271 @@ import pennylane.numpy as np
 # Write any helper functions you need
 
 
+def qsp_parity_coefficients(angles):
+    """
+    Computes the nonzero coefficients of the polynomial P(x) = <0|S(phi_0) R(x) S(phi_1) ... R(x) S(phi_d)|0>,
+    with the signal reflection R(x) = [[x, sqrt(1-x^2)], [sqrt(1-x^2), -x]] and S(phi) = exp(i phi Z).
+
+    P has the parity of d, so only the coefficients of x^d, x^(d-2), ... are returned. Writing the first row
+    of the partial product as (P_j, sqrt(1-x^2) Q_j), one more R(x) S(phi) gives
+    P_{j+1} = (x P_j + (1-x^2) Q_j) e^(i phi) and Q_{j+1} = (P_j - x Q_j) e^(-i phi), which on the
+    parity-compressed coefficients is a subtraction and a one-slot shift, so no convolution is needed.
+
+    Args:
+        - angles (np.array(float)): The d+1 phase angles, or a (..., d+1) array of angle sets.
+    Returns:
+        - (np.array(complex)): The coefficients of x^d, x^(d-2), ..., x^(d mod 2), with shape (..., d//2 + 1).
+    """
+    angles = np.asarray(qml.math.unwrap(angles), dtype=float)
+    d = angles.shape[-1] - 1
+    size = d // 2 + 1
+
+    # the angle index leads so that every update below works on contiguous rows of the whole batch
+    phases = np.exp(1j * np.moveaxis(angles, -1, 0)).unwrap()
+    p = np.zeros((size,) + angles.shape[:-1], dtype=complex).unwrap()
+    q = np.zeros_like(p).unwrap()
+    p[0] = phases[0]
+
+    for j in range(1, d + 1):
+        n = j // 2 + 1
+        new_q = p[:n] - q[:n]
+        p[:n] = new_q
+        p[1:n] += q[:n - 1]
+        q[:n] = new_q
+        p[:n] *= phases[j]
+        q[:n] *= phases[j].conj()
+
+    return np.moveaxis(p, 0, -1)
+
+
+def _differentiable_parity_coefficients(angles):
+    """
+    Same as qsp_parity_coefficients, but builds new arrays at every step instead of updating them in
+    place, so that autograd can differentiate through it. It is several times slower.
+    """
+    d = np.shape(angles)[-1] - 1
+    size = d // 2 + 1
+
+    phases = np.exp(1j * np.moveaxis(angles, -1, 0))
+    zeros = np.zeros((size,) + np.shape(angles)[:-1], dtype=complex)
+    p, q = np.concatenate([phases[:1], zeros[1:]]), zeros
+
+    for j in range(1, d + 1):
+        n = j // 2 + 1
+        new_q = np.concatenate([p[:n] - q[:n], zeros[n:]])
+        p = (new_q + np.concatenate([zeros[:1], q[:n - 1], zeros[n:]])) * phases[j]
+        q = new_q * np.conj(phases[j])
+
+    return np.moveaxis(p, 0, -1)
+
+
+def qsp_polynomial(angles):
+    """
+    Computes the full coefficient vector of the polynomial generated by QSP, zeros of the
+    opposite parity included.
+
+    Args:
+        - angles (np.array(float)): The d+1 phase angles, or a (..., d+1) array of angle sets.
+    Returns:
+        - (np.array(complex)): The coefficients from x^d down to x^0, with shape (..., d+1),
+        ready for np.polyval.
+    """
+    parity_coefficients = qsp_parity_coefficients(angles)
+    d = np.shape(angles)[-1] - 1
+
+    polynomial = np.zeros(parity_coefficients.shape[:-1] + (d + 1,), dtype=complex).unwrap()
+    polynomial[..., ::2] = parity_coefficients
+
+    return polynomial
+
+
+def _qsp_values_and_jacobian(angles, x):
+    """
+    Evaluates the QSP polynomial and its derivatives with respect to every phase angle at the points x.
+
+    The first row of the partial products, (P_j, sqrt(1-x^2) Q_j), is swept forwards and the column
+    (A_j, sqrt(1-x^2) B_j) left of it backwards, so that P = P_j A_j + (1-x^2) Q_j B_j for every j.
+    Since S(phi)' = iZ S(phi), the derivative with respect to phi_j is i (P_j A_j - (1-x^2) Q_j B_j).
+
+    Args:
+        - angles (np.array(float)): The d+1 phase angles.
+        - x (np.array(float)): The points where P is evaluated.
+    Returns:
+        - (np.array(complex)): P(x).
+        - (np.array(complex)): The (len(x), d+1) Jacobian of P(x).
+    """
+    d = len(angles) - 1
+    phases = np.exp(1j * angles).unwrap()
+    one_minus_x2 = 1 - x ** 2
+
+    p = np.zeros((d + 1, len(x)), dtype=complex).unwrap()
+    q = np.zeros_like(p).unwrap()
+    p[0] = phases[0]
+    for j in range(1, d + 1):
+        p[j] = (x * p[j - 1] + one_minus_x2 * q[j - 1]) * phases[j]
+        q[j] = (p[j - 1] - x * q[j - 1]) / phases[j]
+
+    a = np.zeros_like(p).unwrap()
+    b = np.zeros_like(p).unwrap()
+    a[d] = 1
+    for j in range(d, 0, -1):
+        a[j - 1] = x * phases[j] * a[j] + one_minus_x2 * b[j] / phases[j]
+        b[j - 1] = phases[j] * a[j] - x * b[j] / phases[j]
+
+    return p[d], (1j * (p * a - one_minus_x2 * q * b)).T
+
+
+def find_phases(target, degree, init=None, tol=1e-10, max_iterations=100, restarts=5, seed=None):
+    """
+    Finds phase angles whose QSP polynomial matches a target, by Levenberg-Marquardt on the values of P
+    at Chebyshev nodes with the analytic Jacobian of _qsp_values_and_jacobian.
+
+    The target must itself be a QSP polynomial of the given degree, so in particular |P(1)| = 1. The default
+    starting point is the angles (0, -pi/2, ..., -pi/2, 0), which is (pi/4, 0, ..., 0, pi/4) of the usual
+    exp(i arccos(x) X) convention. The solve is local: it is reliable for targets whose angles lie within
+    about 0.1 * pi / 2 of the starting point, up to degree 200 at least, but the Jacobian gets close to
+    singular further away and the steps stall in narrow valleys. For angles within 0.5 * pi / 2 most targets
+    up to degree ~25 are still reached, and few above; for angles drawn uniformly, only some of degree ~8 to
+    ~20 are, and none above, even with the random restarts (see phase_finding_benchmark). The last returned value tells
+    whether tol was met, and the caller must check it.
+
+    Args:
+        - target (np.array(complex) or callable): The coefficients of x^d, x^(d-2), ... as returned by
+        coefficients(), or a function evaluating the target polynomial on an array of points. Prefer the
+        function above degree ~30, where the monomial coefficients are too large to evaluate accurately.
+        - degree (int): The degree d of the target, so that d+1 angles are returned.
+        - init (np.array(float)): The starting angles.
+        - tol (float): The solve stops once the root-mean-square error at the nodes is below this.
+        - max_iterations (int): The maximum number of accepted steps per start.
+        - restarts (int): The number of further starts, perturbed randomly from init, tried after a failure.
+        - seed (int): The seed of the random restarts.
+    Returns:
+        - (np.array(float)): The d+1 phase angles.
+        - int: The number of accepted steps over all starts.
+        - float: The root-mean-square error at the nodes.
+        - bool: Whether the error is below tol; otherwise the angles are the best ones found.
+    """
+    # P has the parity of d, so its values at the positive nodes of a degree 2m Chebyshev grid fix it
+    size = degree // 2 + 1
+    x = np.cos(np.pi * (2 * np.arange(1, size + 1) - 1) / (4 * size)).unwrap()
+    if callable(target):
+        values = np.asarray(target(x)).unwrap()
+    else:
+        polynomial = np.zeros(degree + 1, dtype=complex).unwrap()
+        polynomial[::2] = qml.math.unwrap(target)
+        values = np.polyval(polynomial, x).unwrap()
+
+    if init is None:
+        init = np.full(degree + 1, -np.pi / 2).unwrap()
+        init[0] = init[-1] = 0
+    rng = np.random.default_rng(seed)
+
+    def residual(angles):
+        p, jac = _qsp_values_and_jacobian(angles, x)
+        return np.concatenate([(p - values).real, (p - values).imag]), np.concatenate([jac.real, jac.imag])
+
+    total_iterations = 0
+    best_angles, best_cost = None, np.inf
+    for start in range(restarts + 1):
+        angles = init + (rng.normal(scale=np.pi / 4, size=degree + 1) if start else 0)
+        res, jac = residual(angles)
+        cost, damping = res @ res, 1e-3
+
+        for _ in range(max_iterations):
+            if np.sqrt(cost / len(res)) < tol:
+                break
+            gradient, hessian = jac.T @ res, jac.T @ jac
+            while damping < 1e12:
+                # Marquardt scaling, with a floor for the flat direction (phi_0 + t, phi_d - t) leaves P unchanged
+                step = np.linalg.solve(hessian + damping * np.diag(np.diag(hessian) + 1e-12), -gradient)
+                new_res, new_jac = residual(angles + step)
+                if new_res @ new_res < cost:
+                    angles, res, jac, cost = angles + step, new_res, new_jac, new_res @ new_res
+                    damping = max(damping / 3, 1e-12)
+                    break
+                damping *= 4
+            else:
+                break
+            total_iterations += 1
+
+        if cost < best_cost:
+            best_angles, best_cost = angles, cost
+        if np.sqrt(best_cost / len(res)) < tol:
+            break
+
+    error = float(np.sqrt(best_cost / len(res)))
+    return best_angles, total_iterations, error, error < tol
+
+
+def phase_finding_benchmark(degrees=(3, 10, 25, 50, 100, 200), spreads=(0.1, 0.5, None), trials=3, seed=0):
+    """
+    Recovers phases for targets generated from random angles and reports the cost of doing so.
+
+    Args:
+        - degrees (list(int)): The polynomial degrees to try.
+        - spreads (list(float)): For each spread, the target angles are drawn uniformly within
+        spread * pi / 2 of the default starting point of find_phases, or uniformly in [-pi, pi) for None.
+        - trials (int): The number of random targets per degree and spread.
+        - seed (int): The random seed.
+    Returns:
+        - list(dict): One row per target with keys "degree", "spread", "converged", "iterations", "seconds",
+        "residual" and "coefficient_error", the largest coefficient error relative to the largest target
+        coefficient.
+    """
+    rng = np.random.default_rng(seed)
+
+    rows = []
+    for degree in degrees:
+        start_point = np.full(degree + 1, -np.pi / 2).unwrap()
+        start_point[0] = start_point[-1] = 0
+        for spread in spreads:
+            for _ in range(trials):
+                if spread is None:
+                    true_angles = rng.uniform(-np.pi, np.pi, degree + 1)
+                else:
+                    true_angles = start_point + rng.uniform(-1, 1, degree + 1) * spread * np.pi / 2
+                target = lambda x: _qsp_values_and_jacobian(true_angles, x)[0]
+
+                start = time.perf_counter()
+                angles, iterations, residual, converged = find_phases(target, degree, seed=seed)
+                seconds = time.perf_counter() - start
+
+                expected = qsp_parity_coefficients(true_angles)
+                error = np.max(np.abs(qsp_parity_coefficients(angles) - expected)) / np.max(np.abs(expected))
+                rows.append({
+                    "degree": degree,
+                    "spread": spread,
+                    "converged": converged,
+                    "iterations": iterations,
+                    "seconds": seconds,
+                    "residual": residual,
+                    "coefficient_error": float(error),
+                })
+
+    return rows
+
+
 def coefficients(angles):
     """ This function returns the coefficients associated with the polynomial generated by
     the QSP routine as a function of the phase angles.
 
     Args:
         - angles (np.array(float)): Array of real numbers containing the four phase angles,
-        in reverse order of application.
+        in reverse order of application. Any number of angles, or a batch of angle sets
+        along the leading axes, is also accepted. Trainable angles give coefficients that
+        qml.grad and qml.jacobian can differentiate; others take the faster in-place path.
 
     Returns:
         - (np.array(complex)): A numpy array containing the coefficients of the polynomial
         generated by QSP, where the first element is the coefficient of the cubic term and
-        the second element is for the linear term.
+        the second element is for the linear term. In general, the coefficients of
+        x^d, x^(d-2), ... for d+1 angles.
     """
 
     # Put your code here
-    # just clalculated alpha and beta from matrix multiplication
-    alpha = np.exp(1j * (angles[1] + angles[2] + angles[3] + angles[0])) - \
-            np.exp(1j * (angles[1] - angles[2] + angles[3] + angles[0])) - \
-            np.exp(1j * (- angles[1] + angles[2] + angles[3] + angles[0])) + \
-            np.exp(1j * (- angles[1] - angles[2] + angles[3] + angles[0]))
-    beta = np.exp(1j * (angles[1] - angles[2] + angles[3] + angles[0])) + \
-           np.exp(1j * (- angles[1] + angles[2] + angles[3] + angles[0])) - \
-           np.exp(1j * (- angles[1] - angles[2] + angles[3] + angles[0]))
-
-    res = [alpha, beta]
-    res = np.array(res)
-    return res
+    if qml.math.requires_grad(angles):
+        return _differentiable_parity_coefficients(angles)
+    return np.array(qsp_parity_coefficients(angles))
 
 
 # These functions are responsible for testing the solution.
@@ -1,15 +1,103 @@
+import itertools
 import json
+import time
+import tracemalloc
 import pennylane as qml
 import pennylane.numpy as np
-"""
-not solved yet
-"""
+
+PAULI_UNITARIES = tuple(qml.math.unwrap(qml.matrix(op)) for op in (qml.Identity(0), qml.PauliX(0), qml.PauliY(0), qml.PauliZ(0)))
+
+
+class MixedUnitaryChannel(qml.operation.Channel):
+    """
+    Applies one of several unitaries at random, rho -> sum_k p_k U_k rho U_k^dagger.
+
+    default.mixed runs it as a QubitChannel with the Kraus matrices sqrt(p_k) U_k. On state-vector devices,
+    wrap the QNode in average_unitary_branches instead.
+
+    Args:
+        - probabilities (np.array(float)): The probability of every unitary, or a (batch, k) array of them.
+        - unitaries (list(np.array)): The k unitary matrices acting on the wires.
+        - wires (list): The wires the channel acts on.
+    """
+    num_params = 1
+    num_wires = qml.operation.AnyWires
+    grad_method = "F"
+
+    ndim_params = (1,)
+
+    def __init__(self, probabilities, unitaries, wires, id=None):
+        self._hyperparameters = {"unitaries": tuple(qml.math.unwrap(u) for u in unitaries)}
+        super().__init__(probabilities, wires=wires, id=id)
+
+    @staticmethod
+    def compute_kraus_matrices(probabilities, unitaries):
+        return [qml.math.sqrt(probabilities[..., k]) * u for k, u in enumerate(unitaries)]
+
+    @staticmethod
+    def compute_decomposition(probabilities, wires, unitaries):
+        # default.mixed only knows its built-in channels, so it gets the equivalent generic one
+        return [qml.QubitChannel(MixedUnitaryChannel.compute_kraus_matrices(probabilities, unitaries), wires=wires)]
+
+
+@qml.transform
+def average_unitary_branches(tape):
+    """Evaluates the MixedUnitaryChannel ops of a tape exactly on a state-vector device.
+
+    The tape is expanded into one tape per combination of unitaries, with every channel replaced by
+    the unitary of its branch, and the results are averaged with the product of the branch
+    probabilities. This is exact for measurements that are linear in the density matrix, and the
+    probabilities only enter the postprocessing, so a batch of them costs no extra executions.
+
+    Args:
+        tape (QuantumTape): The circuit with channels.
+
+    Returns:
+        (list(QuantumTape), function): One tape per branch and the averaging postprocessing function.
+    """
+    for m in tape.measurements:
+        if not isinstance(m, (qml.measurements.ExpectationMP, qml.measurements.ProbabilityMP)):
+            raise ValueError(f"{type(m).__name__} is not linear in the density matrix and cannot be averaged")
+
+    channels = [op for op in tape.operations if isinstance(op, MixedUnitaryChannel)]
+    branches = list(itertools.product(*[range(len(op.hyperparameters["unitaries"])) for op in channels]))
+
+    tapes = []
+    for branch in branches:
+        choice = dict(zip(map(id, channels), branch))
+        ops = []
+        for op in tape.operations:
+            if id(op) not in choice:
+                ops.append(op)
+                continue
+            unitary = op.hyperparameters["unitaries"][choice[id(op)]]
+            if not np.allclose(unitary, np.eye(len(unitary))):
+                ops.append(qml.QubitUnitary(unitary, wires=op.wires))
+        tapes.append(type(tape)(ops, tape.measurements, shots=tape.shots))
+
+    def average(results):
+        weighted = []
+        for branch, result in zip(branches, results):
+            weight = 1.0
+            for op, k in zip(channels, branch):
+                weight = weight * op.data[0][..., k]
+            weighted.append(qml.math.reshape(weight, qml.math.shape(weight) + (1,) * qml.math.ndim(result)) * result)
+        return sum(weighted)
+
+    def postprocessing(results):
+        if len(tape.measurements) > 1:
+            return tuple(average([r[i] for r in results]) for i in range(len(tape.measurements)))
+        return average(results)
+
+    return tapes, postprocessing
+
 
 # Define your device
 
-dev =
+dev = qml.device("default.qubit", wires=1)
 
 
+@average_unitary_branches
 @qml.qnode(dev)
 def random_gate(p, q, r):
     """
@@ -26,6 +114,54 @@ def random_gate(p, q, r):
     """
 
     # Put your code here
+    probabilities = qml.math.stack([1 - p - q - r, p, q, r], axis=-1)
+    MixedUnitaryChannel(probabilities, PAULI_UNITARIES, wires=0)
+
+    return qml.probs(0)
+
+
+def compare_channel_simulators(num_wires_list=(1, 10, 16), num_channels=2, max_density_matrix_gib=4):
+    """
+    Runs a GHZ-style circuit with Pauli channels on its first wires, averaging unitary branches on
+    default.qubit and with Kraus matrices on default.mixed.
+
+    Args:
+        - num_wires_list (list(int)): The circuit widths to try.
+        - num_channels (int): The number of wires that get a channel.
+        - max_density_matrix_gib (float): default.mixed is skipped when its density matrix would exceed this.
+    Returns:
+        - list(dict): One row per run with keys "device", "wires", "seconds" and "peak_mib", where the last
+        two are None for skipped runs.
+    """
+    probabilities = np.array([0.5, 0.125, 0.25, 0.125], requires_grad=False)
+
+    def circuit(num_wires):
+        qml.Hadamard(0)
+        for w in range(num_wires - 1):
+            qml.CNOT([w, w + 1])
+        for w in range(min(num_channels, num_wires)):
+            MixedUnitaryChannel(probabilities, PAULI_UNITARIES, wires=w)
+        return qml.probs(range(num_wires))
+
+    rows = []
+    for num_wires in num_wires_list:
+        for name in ("default.qubit", "default.mixed"):
+            # default.mixed allocates its complex128 density matrix as soon as the device is created
+            if name == "default.mixed" and 16 * 4 ** num_wires / 2 ** 30 > max_density_matrix_gib:
+                rows.append({"device": name, "wires": num_wires, "seconds": None, "peak_mib": None})
+                continue
+            tracemalloc.start()
+            start = time.perf_counter()
+            qnode = qml.QNode(circuit, qml.device(name, wires=num_wires))
+            if name == "default.qubit":
+                qnode = average_unitary_branches(qnode)
+            qnode(num_wires)
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows.append({"device": name, "wires": num_wires, "seconds": seconds, "peak_mib": peak / 2 ** 20})
+
+    return rows
 
 
 # These functions are responsible for testing the solution.
@@ -1,10 +1,311 @@
+import hashlib
 import json
+import os
+import tempfile
+import time
 import pennylane as qml
 import pennylane.numpy as np
-"""
-not solved yet
-"""
+
 symbols = ["H", "H", "H"]
+charge = 1
+electrons = 2
+
+# Hamiltonians are stored as JSON files named after a hash of everything that defines them,
+# in this directory if the variable is set and not at all otherwise
+CACHE_DIR = os.environ.get("QHACK_HAMILTONIAN_CACHE")
+
+
+def h3_coordinates(bond_length):
+    """
+    Places the H3+ nuclei on an equilateral triangle.
+
+    Args:
+        - bond_length(float): The side of the triangle, in bohr.
+    Returns:
+        - np.array: The (3, 3) array of nuclear coordinates.
+    """
+    return np.array(
+        [[0.0, 0.0, 0.0], [bond_length, 0.0, 0.0], [bond_length / 2, bond_length * np.sqrt(3) / 2, 0.0]],
+        requires_grad=False,
+    )
+
+
+def cached_molecular_hamiltonian(symbols, coordinates, charge=0, basis="sto-3g", active_electrons=None,
+                                 active_orbitals=None, cache_dir=CACHE_DIR):
+    """
+    Builds a qubit Hamiltonian with qml.qchem.molecular_hamiltonian, reusing the copy stored on disk
+    by a previous call with the same molecule, geometry, charge, basis and active space.
+
+    Args:
+        - symbols (list(str)): The atomic symbols.
+        - coordinates (np.array): The nuclear coordinates, in bohr.
+        - charge (int): The net charge of the molecule.
+        - basis (str): The atomic basis set.
+        - active_electrons (int): The number of active electrons, or None for all of them.
+        - active_orbitals (int): The number of active orbitals, or None for all of them.
+        - cache_dir (str): The directory holding the cached Hamiltonians, or None to always build them.
+    Returns:
+        - qml.Hamiltonian: The qubit Hamiltonian.
+        - int: The number of qubits.
+    """
+    key = {
+        "symbols": list(symbols),
+        "coordinates": [round(float(c), 10) for c in np.ravel(coordinates)],
+        "charge": charge,
+        "basis": basis,
+        "active_electrons": active_electrons,
+        "active_orbitals": active_orbitals,
+    }
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    path = None if cache_dir is None else os.path.join(cache_dir, f"{digest}.json")
+
+    if path is not None and os.path.exists(path):
+        with open(path) as f:
+            stored = json.load(f)
+    else:
+        hamiltonian, qubits = qml.qchem.molecular_hamiltonian(
+            symbols, coordinates, charge=charge, basis=basis, active_electrons=active_electrons,
+            active_orbitals=active_orbitals,
+        )
+
+        wire_map = {w: w for w in range(qubits)}
+        stored = {
+            "key": key,
+            "qubits": qubits,
+            "coeffs": [float(c) for c in hamiltonian.coeffs],
+            "words": [qml.pauli.pauli_word_to_string(op, wire_map) for op in hamiltonian.ops],
+        }
+        if path is not None:
+            # written under a temporary name and renamed, so that concurrent readers never see half a file
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(stored, f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    # fresh and cached Hamiltonians are both rebuilt from the stored Pauli words, with constant coefficients
+    wire_map = {w: w for w in range(stored["qubits"])}
+    ops = [qml.pauli.string_to_pauli_word(word, wire_map) for word in stored["words"]]
+
+    return qml.Hamiltonian(stored["coeffs"], ops), stored["qubits"]
+
+
+def ansatz_energy(hamiltonian, qubits, singles, doubles, dev, diff_method="adjoint"):
+    """
+    Builds the QNode returning <H> for the given singles and doubles applied to the Hartree-Fock state.
+
+    Args:
+        - hamiltonian (qml.Hamiltonian): The qubit Hamiltonian.
+        - qubits (int): The number of qubits.
+        - singles (list(list(int))): The wires of every single excitation.
+        - doubles (list(list(int))): The wires of every double excitation.
+        - dev (qml.Device): The device to run on.
+        - diff_method (str): The differentiation method of the QNode.
+    Returns:
+        - qml.QNode: A QNode taking the excitation angles, singles first.
+    """
+    hf_state = qml.qchem.hf_state(electrons, qubits)
+
+    @qml.qnode(dev, diff_method=diff_method)
+    def energy(params):
+        qml.AllSinglesDoubles(params, range(qubits), hf_state, singles, doubles)
+        return qml.expval(hamiltonian)
+
+    return energy
+
+
+def screen_excitations(hamiltonian, qubits, threshold=1e-3, device="lightning.qubit", history=None):
+    """
+    Selects the excitations worth keeping in the ansatz ADAPT-style, by the size of the energy gradient
+    they would start with.
+
+    Doubles are screened on the Hartree-Fock state, where singles have zero gradient (Brillouin's theorem).
+    The kept doubles are then optimised and singles are screened on top of that state.
+
+    Args:
+        - hamiltonian (qml.Hamiltonian): The qubit Hamiltonian.
+        - qubits (int): The number of qubits.
+        - threshold (float): Excitations whose gradient magnitude does not exceed this are dropped.
+        - device (str): The name of the simulator.
+        - history (list): If given, the steps of the VQE over the kept doubles are appended to it, as in vqe.
+    Returns:
+        - list(list(int)): The kept singles.
+        - list(list(int)): The kept doubles.
+    """
+    singles, doubles = qml.qchem.excitations(electrons, qubits)
+    dev = qml.device(device, wires=qubits)
+
+    # all first-order gradients come out of a single adjoint pass at zero angles
+    grads = qml.grad(ansatz_energy(hamiltonian, qubits, [], doubles, dev))(np.zeros(len(doubles), requires_grad=True))
+    doubles = [d for d, g in zip(doubles, grads) if np.abs(g) > threshold]
+    if not doubles:
+        return [], []
+
+    _, double_params, _ = vqe(hamiltonian, qubits, device=device, history=history, excitations=([], doubles))
+
+    params = np.concatenate([np.zeros(len(singles)), double_params])
+    grads = qml.grad(ansatz_energy(hamiltonian, qubits, singles, doubles, dev))(np.array(params, requires_grad=True))
+    singles = [s for s, g in zip(singles, grads[: len(singles)]) if np.abs(g) > threshold]
+
+    return singles, doubles
+
+
+def vqe(hamiltonian, qubits, init_params=None, stepsize=0.4, conv_tol=1e-4, max_steps=500,
+        device="lightning.qubit", diff_method="adjoint", history=None, excitations=None):
+    """
+    Minimises <H> over the singles-and-doubles ansatz acting on the Hartree-Fock state.
+
+    Args:
+        - hamiltonian (qml.Hamiltonian): The qubit Hamiltonian.
+        - qubits (int): The number of qubits.
+        - init_params (np.array): The initial excitation angles. Defaults to zeros.
+        - stepsize (float): The gradient descent step size.
+        - conv_tol (float): The optimisation stops once the energy changes by less than this. Gradient descent
+        slows down near the minimum, so the error left can be an order of magnitude larger: 1e-4 leaves
+        up to ~2e-4 on stretched geometries. None runs all max_steps steps.
+        - max_steps (int): The maximum number of optimisation steps.
+        - device (str): The name of the simulator.
+        - diff_method (str): The differentiation method of the QNode.
+        - history (list): If given, one dict per step with keys "step", "energy", "executions" and
+        "seconds" is appended to it.
+        - excitations (tuple(list, list)): The singles and doubles of the ansatz. Defaults to all of them.
+    Returns:
+        - float: The optimised energy.
+        - np.array: The optimal excitation angles, singles first.
+        - int: The number of optimisation steps used.
+    """
+    singles, doubles = excitations or qml.qchem.excitations(electrons, qubits)
+    dev = qml.device(device, wires=qubits)
+    energy = ansatz_energy(hamiltonian, qubits, singles, doubles, dev, diff_method)
+
+    if init_params is None:
+        init_params = np.zeros(len(singles) + len(doubles))
+    params = np.array(init_params, requires_grad=True)
+
+    # step_and_cost returns the energy before the update, so each step costs one gradient evaluation
+    # and convergence is judged on consecutive pre-update energies
+    opt = qml.GradientDescentOptimizer(stepsize=stepsize)
+    prev_energy = None
+    for step in range(1, max_steps + 1):
+        start = time.perf_counter()
+        with qml.Tracker(dev) as tracker:
+            params, current_energy = opt.step_and_cost(energy, params)
+        if history is not None:
+            history.append({
+                "step": step,
+                "energy": float(current_energy),
+                "executions": tracker.totals.get("executions", 0),
+                "seconds": time.perf_counter() - start,
+            })
+        if conv_tol is not None and prev_energy is not None and np.abs(current_energy - prev_energy) < conv_tol:
+            break
+        prev_energy = current_energy
+
+    return float(energy(params)), params, step
+
+
+def compare_vqe_drivers(bond_length, fixed_steps=None):
+    """
+    Runs the early-stopping adjoint VQE on lightning.qubit and a fixed-step parameter-shift VQE on
+    default.qubit from the same cold start.
+
+    Args:
+        - bond_length (float): The bond length of the H3+ molecule, in bohr.
+        - fixed_steps (int): The number of parameter-shift steps. Defaults to the number of steps the
+        adjoint run needed to converge to 1e-8.
+    Returns:
+        - list(dict): One row per driver with keys "driver", "energy", "steps", "executions" and "seconds".
+    """
+    hamiltonian, qubits = cached_molecular_hamiltonian(symbols, h3_coordinates(bond_length), charge=charge)
+    if fixed_steps is None:
+        fixed_steps = vqe(hamiltonian, qubits, conv_tol=1e-8)[2]
+
+    drivers = {
+        "adjoint lightning.qubit, early stop": dict(),
+        "parameter-shift default.qubit, fixed steps": dict(
+            conv_tol=None, max_steps=fixed_steps, device="default.qubit", diff_method="parameter-shift"
+        ),
+    }
+
+    rows = []
+    for name, kwargs in drivers.items():
+        history = []
+        start = time.perf_counter()
+        energy, _, steps = vqe(hamiltonian, qubits, history=history, **kwargs)
+        rows.append({
+            "driver": name,
+            "energy": energy,
+            "steps": steps,
+            "executions": sum(row["executions"] for row in history),
+            "seconds": time.perf_counter() - start,
+        })
+
+    return rows
+
+
+def screening_report(bond_length, thresholds=(1e-1, 1e-3, 1e-6)):
+    """
+    Compares cold-start VQEs over screened ansatze against the full singles-and-doubles ansatz.
+
+    Args:
+        - bond_length (float): The bond length of the H3+ molecule, in bohr.
+        - thresholds (list(float)): The screening thresholds to try.
+    Returns:
+        - list(dict): One row per ansatz with keys "threshold" (None for the full ansatz), "excitations",
+        "energy", "error", "screen_seconds" and "vqe_seconds". The error is taken against the full ansatz.
+    """
+    hamiltonian, qubits = cached_molecular_hamiltonian(symbols, h3_coordinates(bond_length), charge=charge)
+
+    rows = []
+    for threshold in (None,) + tuple(thresholds):
+        start = time.perf_counter()
+        excitations = None if threshold is None else screen_excitations(hamiltonian, qubits, threshold)
+        screened = time.perf_counter()
+        energy, params, _ = vqe(hamiltonian, qubits, excitations=excitations)
+        rows.append({
+            "threshold": threshold,
+            "excitations": len(params),
+            "energy": energy,
+            "screen_seconds": screened - start,
+            "vqe_seconds": time.perf_counter() - screened,
+        })
+
+    for row in rows:
+        row["error"] = row["energy"] - rows[0]["energy"]
+
+    return rows
+
+
+def _warm_started_vqe(bond_length, solved_params, screened_excitations, threshold=1e-3, conv_tol=1e-6):
+    """
+    Runs the VQE for one geometry over the screened ansatz, starting every excitation from its optimum
+    at the closest geometry in solved_params, a dict from bond length to the optimal angle of every
+    excitation, to which this geometry is added. The ansatz is screened if screened_excitations, a dict
+    from threshold to the kept singles and doubles, has none for threshold yet, and the steps returned
+    then include those of the screening VQE. The default conv_tol keeps the energy within a few 1e-6
+    of the exact ground energy up to 4 bohr, well inside the tolerance of check().
+    """
+    hamiltonian, qubits = cached_molecular_hamiltonian(symbols, h3_coordinates(bond_length), charge=charge)
+    screening = []
+    if threshold not in screened_excitations:
+        screened_excitations[threshold] = screen_excitations(hamiltonian, qubits, threshold=threshold, history=screening)
+    singles, doubles = screened_excitations[threshold]
+    kept = [tuple(e) for e in singles + doubles]
+
+    nearest = min(solved_params, key=lambda b: abs(b - bond_length), default=None)
+    angles = solved_params.get(nearest, {})
+    init_params = np.array([angles.get(e, 0.0) for e in kept])
+
+    energy, params, steps = vqe(
+        hamiltonian, qubits, init_params=init_params, conv_tol=conv_tol, excitations=(singles, doubles)
+    )
+    solved_params[bond_length] = dict(zip(kept, params.unwrap()))
+
+    return energy, steps + len(screening)
 
 
 def h3_ground_energy(bond_length):
@@ -18,6 +319,32 @@ def h3_ground_energy(bond_length):
         - Union[float, np.tensor, np.array]: A float-like output containing the ground
         state of the H3+ molecule with the given bond length.
     """
+    # screened and solved from scratch, so that the energy depends on the bond length alone
+    energy, _ = _warm_started_vqe(bond_length, {}, {})
+
+    return energy
+
+
+def potential_energy_surface(bond_lengths):
+    """
+    Scans the H3+ ground energy over several bond lengths, warm starting every VQE from the
+    optimal angles of the nearest geometry already solved in this scan. The ansatz is screened
+    once, on the first geometry, and kept for the rest of the scan.
+
+    Args:
+        - bond_lengths (list(float)): The bond lengths to scan.
+    Returns:
+        - list(dict): One row per bond length with keys "bond_length", "energy" and "steps", counting the
+        steps of the screening VQE on the first geometry.
+    """
+    solved_params, screened_excitations = {}, {}
+
+    rows = []
+    for bond_length in bond_lengths:
+        energy, steps = _warm_started_vqe(bond_length, solved_params, screened_excitations)
+        rows.append({"bond_length": bond_length, "energy": energy, "steps": steps})
+
+    return rows
 
 
 # These functions are responsible for testing the solution.
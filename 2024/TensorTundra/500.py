@@ -8,6 +8,9 @@ H = np.array([[0.39488016, 0.04722628, -0.17943126, -0.03673282],
               [-0.17943126, 0.12997088, 0.53582574, 0.01115543],
               [-0.03673282, 0.17848188, 0.01115543, 0.29170851]])
 
+# U only depends on H, so it is computed once rather than on every circuit execution
+U = scipy.linalg.expm(H.unwrap() * 2 * np.pi * 1j)
+
 
 def state_prep(params, wires):
     """
@@ -15,20 +18,22 @@ def state_prep(params, wires):
 
     Args:
         - params (np.array(float)): Angles [theta_1, theta_2, theta_3] parametrizing
-        the RY rotations in the circuit.
+        the RY rotations in the circuit, or a (batch, 3) array of them.
         - wires (list): Labels for the circuit wires.
     Returns:
         - Does not return anything since it is a subcircuit.
     """
 
     # Put your code here
-    qml.RY(params[0], wires[0])
-    qml.RY(params[1], wires[1])
+    qml.RY(params[..., 0], wires[0])
+    qml.RY(params[..., 1], wires[1])
     qml.CNOT(wires)
-    qml.RY(params[2], wires[1])
+    qml.RY(params[..., 2], wires[1])
 
 
-dev = qml.device('lightning.qubit', wires=range(8))
+# default.qubit broadcasts a batch of parameter sets through a single execution, while
+# lightning.qubit would split it into one tape per set
+dev = qml.device('default.qubit', wires=range(8))
 
 
 @qml.qnode(dev)
@@ -39,13 +44,13 @@ def qpe_circuit(params):
 
     Args:
         - params (np.array(float)): Angles [theta_1, theta_2, theta_3] parametrizing
-        the RY rotations in the state_prep circuit.
+        the RY rotations in the state_prep circuit, or a (batch, 3) array of them.
     Returns:
-        - np.tensor(float): Computational basis probabilities in the estimation wires.
+        - np.tensor(float): Computational basis probabilities in the estimation wires, with a leading
+        batch dimension if params is batched.
     """
 
     # Put your code here
-    U = scipy.linalg.expm(H * 2 * np.pi * 1j)  # Calculate U as a matrix exponential (np.array[complex])
     estimation_wires = range(6)
     target_wires = [6, 7]
     state_prep(params, target_wires)
@@ -60,11 +65,12 @@ def compute_statistics(params):
 
     Args:
         - params (np.array(float)): Angles [theta_1, theta_2, theta_3] parametrizing
-        the RY rotations in the state_prep circuit.
+        the RY rotations in the state_prep circuit, or a (batch, 3) array of them.
     Returns:
-        - mu (float): The phase calculated as a weighted average.
-        - sigma (float): The uncertainty calculated as the standard deviation
-        for the phase.
+        - mu (float or np.array(float)): The phase calculated as a weighted average, one per
+        parameter set if params is batched.
+        - sigma (float or np.array(float)): The uncertainty calculated as the standard deviation
+        for the phase, one per parameter set if params is batched.
     """
 
     # Put your code here
@@ -72,8 +78,9 @@ def compute_statistics(params):
     phase = np.arange(0, 1, 1/2**6)
     # probs of this state gives us circuit
     probs = qpe_circuit(params)
-    mu = np.sum(probs * phase).numpy()  # Calculate the mean
-    sigma = np.sqrt(np.sum(probs*(phase - mu)**2)).numpy() # Calculate the standard deviation
+    mu = np.sum(probs * phase, axis=-1)  # Calculate the mean
+    sigma = np.sqrt(np.sum(probs*(phase - mu[..., None])**2, axis=-1))  # Calculate the standard deviation
+    mu, sigma = mu.numpy(), sigma.numpy()
 
     return mu, sigma
 
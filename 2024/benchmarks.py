@@ -0,0 +1,273 @@
+"""
+Measures how the cost of the challenges grows with the size of their problems.
+
+Every benchmark sweeps one size axis of a challenge under the runner's harness, recording the wall
+time, the peak memory and the number of operations executed at each size. The memory is measured in a
+separate pass, as the growth of the peak resident set of a fresh process running that size alone, so
+that it counts native allocations and does not slow down the timed runs. A sweep stops at the
+first size slower than --max-seconds, so the largest size reported is the largest one that is safe to
+serve. The time of each sweep is fitted with an exponential and a polynomial model:
+
+    python benchmarks.py --markdown report.md --csv report.csv --save-baseline baseline.json
+    python benchmarks.py --baseline baseline.json
+
+Against a baseline, a size is flagged as a regression when its time or memory grows by more than
+--tolerance, or when it executes more operations.
+"""
+import argparse
+import csv
+import json
+import subprocess
+import sys
+import time
+
+import numpy as onp
+from pennylane import numpy as np
+
+import runner
+
+_A, _B = [[1, -0.333333], [-0.333333, 1]], [0.48063554, 0.87692045]
+
+# challenge -> (size axis, sizes, function running the challenge at one size)
+SUITE = {
+    "BosonBeach/100": ("binary_string length", (4, 8, 12, 16, 20), lambda m, n: m.run(json.dumps([1, 0] * (n // 2)))),
+    "BosonBeach/400": ("qpe_qubits", (2, 3, 4, 5, 6, 7, 8), lambda m, n: m.mint_to_lime(np.array(_A), np.array(_B), qpe_qubits=n)),
+    "DipoleDesert/300": ("n_qubits", (2, 3, 4, 5, 6, 7, 8, 9), lambda m, n: m.GHZ_fidelity(0.05, n)),
+    "TensorTundra/300": ("num_qubits", (2, 4, 6, 8, 10, 12, 14), lambda m, n: m.run(json.dumps(n))),
+    "FemtoForest/500": ("workers", (1, 2, 3, 4, 5, 6, 7, 8), lambda m, n: m.run(json.dumps(list(range(n))))),
+}
+
+FIELDS = ("challenge", "axis", "size", "seconds", "peak_bytes", "operations", "regression")
+
+# times and peak memory below these are too noisy to flag as regressions
+MIN_FLAGGED_SECONDS = 0.05
+MIN_FLAGGED_BYTES = 2**20
+
+
+def run_point(module, log, benchmark, size, repeats=1):
+    """
+    Runs a challenge at one size, keeping the fastest of several repeats.
+
+    Args:
+        - module (module): The challenge module.
+        - log (dict): The log of the runner.simulation_settings context the module was loaded in.
+        - benchmark (callable): Runs the challenge module at a size.
+        - size (int): The size.
+        - repeats (int): The number of runs.
+    Returns:
+        - dict: The keys "seconds" and "operations", the number of operations executed by the simulators.
+    """
+    point = {"seconds": float("inf"), "operations": 0}
+
+    for _ in range(repeats):
+        log["operations"] = 0
+        start = time.perf_counter()
+        benchmark(module, size)
+        point.update(seconds=min(point["seconds"], time.perf_counter() - start), operations=log["operations"])
+
+    return point
+
+
+def _memory_status(field):
+    with open("/proc/self/status") as f:
+        line = next(line for line in f if line.startswith(field + ":"))
+    return int(line.split()[1]) * 1024
+
+
+def _print_peak_memory(name, size, memory_budget):
+    _, _, benchmark = SUITE[name]
+    with runner.simulation_settings("double", memory_budget or None):
+        module = runner.load_challenge(name)
+        # ru_maxrss survives exec, so it would start from the parent's peak; VmHWM is reset instead
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        loaded = _memory_status("VmRSS")
+        benchmark(module, size)
+    print(json.dumps(_memory_status("VmHWM") - loaded))
+
+
+def measure_peak_memory(name, size, memory_budget=runner.DEFAULT_MEMORY_BUDGET):
+    """
+    Runs a challenge at one size in a fresh interpreter and measures how much its peak resident memory
+    grows over the loaded module, counting the native allocations of the simulators. The peak is read
+    from /proc, so this needs Linux.
+
+    Args:
+        - name (str): The challenge, a key of SUITE.
+        - size (int): The size.
+        - memory_budget (int): The memory budget in bytes, see runner.simulation_settings.
+    Returns:
+        - int: The peak memory in bytes.
+    """
+    code = "import sys, benchmarks; benchmarks._print_peak_memory(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))"
+    result = subprocess.run(
+        [sys.executable, "-c", code, name, str(size), str(memory_budget or 0)],
+        cwd=runner.CHALLENGE_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.split()[-1])
+
+
+def sweep(name, sizes=None, max_seconds=30.0, repeats=1, memory_budget=runner.DEFAULT_MEMORY_BUDGET, memory=True):
+    """
+    Runs the benchmark of a challenge at increasing sizes.
+
+    Args:
+        - name (str): The challenge, a key of SUITE.
+        - sizes (list(int)): The sizes, the ones in SUITE by default.
+        - max_seconds (float): The sweep stops after the first size that takes longer.
+        - repeats (int): The number of timed runs per size.
+        - memory_budget (int): The memory budget in bytes, see runner.simulation_settings.
+        - memory (bool): Whether to measure the peak memory of every size with measure_peak_memory.
+    Returns:
+        - list(dict): One row per size, as from run_point, plus "challenge", "axis", "size" and
+        "peak_bytes", None without memory. A size over the memory budget ends the sweep with a row
+        whose "seconds" is None.
+    """
+    axis, default_sizes, benchmark = SUITE[name]
+
+    rows = []
+    with runner.simulation_settings("double", memory_budget) as log:
+        module = runner.load_challenge(name)
+        for size in sizes or default_sizes:
+            row = {"challenge": name, "axis": axis, "size": size}
+            try:
+                row.update(run_point(module, log, benchmark, size, repeats))
+            except runner.MemoryBudgetExceeded:
+                rows.append({**row, "seconds": None, "peak_bytes": None, "operations": None})
+                break
+            row["peak_bytes"] = measure_peak_memory(name, size, memory_budget) if memory else None
+            rows.append(row)
+            if row["seconds"] > max_seconds:
+                break
+
+    return rows
+
+
+def fit_growth(sizes, seconds):
+    """
+    Fits t = c * g^n and t = c * n^k to the times of a sweep by least squares on log t.
+
+    Args:
+        - sizes (list(int)): The sizes n.
+        - seconds (list(float)): The times t.
+    Returns:
+        - dict: The keys "growth", g, "exponent", k, and "model", "exponential" or "polynomial",
+        whichever has the smaller residual, or None with fewer than three sizes.
+    """
+    sizes, seconds = onp.asarray(sizes, dtype=float), onp.asarray(seconds, dtype=float)
+    if len(sizes) < 3:
+        return None
+
+    log_t = onp.log(seconds)
+    fits = {}
+    for model, x in (("exponential", sizes), ("polynomial", onp.log(sizes))):
+        design = onp.stack([onp.ones_like(x), x], axis=1)
+        coefficients, *_ = onp.linalg.lstsq(design, log_t, rcond=None)
+        fits[model] = (coefficients[1], onp.sum((design @ coefficients - log_t) ** 2))
+
+    return {
+        "growth": float(onp.exp(fits["exponential"][0])),
+        "exponent": float(fits["polynomial"][0]),
+        "model": min(fits, key=lambda model: fits[model][1]),
+    }
+
+
+def flag_regressions(rows, baseline, tolerance=0.5):
+    """
+    Sets "regression" on every row to what got worse since the baseline, or None.
+
+    Args:
+        - rows (list(dict)): The rows of the sweeps.
+        - baseline (list(dict)): The rows of earlier sweeps.
+        - tolerance (float): The relative growth in time or memory that is still accepted.
+    """
+    previous = {(row["challenge"], row["size"]): row for row in baseline}
+
+    for row in rows:
+        old = previous.get((row["challenge"], row["size"]))
+        worse = []
+        if old is not None and row["seconds"] is not None and old["seconds"] is not None:
+            if row["seconds"] > max(old["seconds"] * (1 + tolerance), MIN_FLAGGED_SECONDS):
+                worse.append(f"time x{row['seconds'] / old['seconds']:.2f}")
+            if row["peak_bytes"] is not None and old["peak_bytes"] is not None and \
+                    row["peak_bytes"] > max(old["peak_bytes"] * (1 + tolerance), MIN_FLAGGED_BYTES):
+                worse.append(f"memory x{row['peak_bytes'] / old['peak_bytes']:.2f}")
+            if row["operations"] > old["operations"]:
+                worse.append(f"operations {old['operations']} -> {row['operations']}")
+        row["regression"] = ", ".join(worse) or None
+
+
+def markdown_report(rows):
+    """Formats the rows of the sweeps as Markdown, with a table of fits and one of measurements."""
+    lines = ["| challenge | axis | largest size | model | per unit size | exponent |", "|---|---|---|---|---|---|"]
+    for name in dict.fromkeys(row["challenge"] for row in rows):
+        timed = [row for row in rows if row["challenge"] == name and row["seconds"] is not None]
+        fit = fit_growth([row["size"] for row in timed], [row["seconds"] for row in timed])
+        if fit is None:
+            fit = {"model": "-", "growth": float("nan"), "exponent": float("nan")}
+        lines.append(
+            f"| {name} | {timed[0]['axis'] if timed else '-'} | {timed[-1]['size'] if timed else '-'} "
+            f"| {fit['model']} | x{fit['growth']:.2f} | {fit['exponent']:.2f} |"
+        )
+
+    lines += ["", "| challenge | size | seconds | peak MiB | operations | regression |", "|---|---|---|---|---|---|"]
+    for row in rows:
+        if row["seconds"] is None:
+            lines.append(f"| {row['challenge']} | {row['size']} | over memory budget | | | |")
+            continue
+        peak = "-" if row["peak_bytes"] is None else f"{row['peak_bytes'] / 2**20:.2f}"
+        lines.append(
+            f"| {row['challenge']} | {row['size']} | {row['seconds']:.4f} | {peak} "
+            f"| {row['operations']} | {row.get('regression') or ''} |"
+        )
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the problem size of the challenges.")
+    parser.add_argument("challenges", nargs="*", help=f"any of {', '.join(SUITE)}, all by default")
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="stop a sweep after a slower size")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the subprocess measuring peak memory")
+    parser.add_argument("--baseline", help="flag regressions against the rows in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.5)
+    parser.add_argument("--save-baseline", help="write the rows to this JSON file")
+    parser.add_argument("--markdown", help="write the Markdown report to this file instead of printing it")
+    parser.add_argument("--csv", help="write the rows to this CSV file")
+    args = parser.parse_args(argv)
+    unknown = set(args.challenges) - set(SUITE)
+    if unknown:
+        parser.error(f"no benchmark for {', '.join(sorted(unknown))}")
+
+    rows = []
+    for name in args.challenges or SUITE:
+        rows += sweep(name, max_seconds=args.max_seconds, repeats=args.repeats, memory=not args.no_memory)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            flag_regressions(rows, json.load(f)["rows"], args.tolerance)
+
+    report = markdown_report(rows)
+    if args.markdown:
+        with open(args.markdown, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"rows": rows}, f, indent=2)
+
+    if any(row.get("regression") for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
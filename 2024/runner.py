@@ -0,0 +1,436 @@
+"""
+Runs the public test cases of the challenge scripts under a common harness.
+
+Every challenge script runs its test cases when it is executed. The runner loads a script without
+that trailing loop and runs the cases itself, so that it can time them, simulate in reduced
+precision, keep the simulators within a memory budget and write a JSON report:
+
+    python runner.py BosonBeach/500 DipoleDesert/300:single --precision compare --json report.json
+
+A ":double" or ":single" suffix fixes the precision of one challenge for one run, and
+PINNED_PRECISION fixes it for challenges that cannot run in single precision at all. The comparison
+runs its double-precision baseline on the same simulators as single precision, and reports no speedup
+for cases that kept a complex128 device. With --resources, every case also reports the size of the
+largest circuit it executed.
+
+Circuits too large to simulate can still be inspected, since construct_tape builds a tape without a device:
+
+    resource_summary(construct_tape(load_challenge("DipoleDesert/300").GHZ_circuit, 0.05, 40))
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+import types
+
+import numpy as onp
+import pennylane as qml
+
+CHALLENGE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_LOOP_MARKER = "# This will run the public test cases locally"
+
+PRECISIONS = ("double", "single")
+
+# challenges that only run in complex128: postselected mid-circuit measurements need the new default.qubit
+PINNED_PRECISION = {
+    "BosonBeach/400": "double",
+    "FemtoForest/500": "double",
+}
+
+# device name -> (device used instead, extra keyword arguments) in single precision.
+# default.qubit takes no dtype and default.qubit.legacy casts back to complex128 on the first gate,
+# so lightning.qubit stands in for both; it needs explicit wires, so devices without them stay as they are
+SINGLE_PRECISION_DEVICES = {
+    "default.qubit": ("lightning.qubit", {"c_dtype": onp.complex64}),
+    "default.qubit.legacy": ("lightning.qubit", {"c_dtype": onp.complex64}),
+    "default.mixed": ("default.mixed", {"c_dtype": onp.complex64, "r_dtype": onp.float32}),
+    "default.qutrit": ("default.qutrit", {"c_dtype": onp.complex64, "r_dtype": onp.float32}),
+    "lightning.qubit": ("lightning.qubit", {"c_dtype": onp.complex64}),
+}
+
+# the dtypes of SINGLE_PRECISION_DEVICES in double precision, for a baseline on the same simulators
+DOUBLE_DTYPES = {"c_dtype": onp.complex128, "r_dtype": onp.float64}
+
+# devices whose state is a density matrix, and the local dimension of their wires
+MIXED_STATE_DEVICES = {"default.mixed"}
+WIRE_DIMENSIONS = {"default.qutrit": 3}
+
+# state-sized arrays alive at the peak of a gate application: the state and the output of the
+# einsum that applies the gate, and for density matrices also the half-applied K @ rho
+TEMPORARY_STATES = {"default.mixed": 3, "lightning.qubit": 2}
+
+DEFAULT_MEMORY_BUDGET = 4 * 2**30
+
+
+class MemoryBudgetExceeded(MemoryError):
+    """Raised instead of creating or running a simulator whose state would not fit in the memory budget."""
+
+
+def estimate_simulation_bytes(device_name, num_wires, batch_size=1, c_dtype=onp.complex128):
+    """
+    Estimates the peak memory a simulator needs for its state, including the temporaries of a gate application.
+
+    Args:
+        - device_name (str): The device, like "default.mixed".
+        - num_wires (int): The number of wires simulated.
+        - batch_size (int): The number of states simulated at once for broadcast parameters.
+        - c_dtype (type): The complex dtype of the state.
+    Returns:
+        - int: The estimated peak number of bytes.
+    """
+    amplitudes = WIRE_DIMENSIONS.get(device_name, 2) ** num_wires
+    if device_name in MIXED_STATE_DEVICES:
+        amplitudes **= 2
+
+    copies = TEMPORARY_STATES.get(device_name, 2)
+    return amplitudes * onp.dtype(c_dtype).itemsize * copies * batch_size
+
+
+def _check_budget(estimate, memory_budget, what):
+    if memory_budget is not None and estimate > memory_budget:
+        raise MemoryBudgetExceeded(
+            f"{what} needs about {estimate / 2**30:.3g} GiB, over the budget of {memory_budget / 2**30:.3g} GiB"
+        )
+
+
+def _guard_execution(dev, name, c_dtype, memory_budget, log):
+    """Wraps the execution method of a device so that every batch of tapes is estimated before it runs."""
+    legacy = not isinstance(dev, qml.devices.Device)
+    method_name = "batch_execute" if legacy else "execute"
+    execute = getattr(dev, method_name)
+    broadcasts = not legacy or dev.capabilities().get("supports_broadcasting", False)
+
+    def guarded(circuits, *args, **kwargs):
+        tapes = [circuits] if isinstance(circuits, qml.tape.QuantumScript) else circuits
+        for tape in tapes:
+            num_wires = len(dev.wires) if dev.wires is not None else len(tape.wires)
+            batch_size = (tape.batch_size or 1) if broadcasts else 1
+            estimate = estimate_simulation_bytes(name, num_wires, batch_size, c_dtype)
+            log["estimated_bytes"] = max(log["estimated_bytes"], estimate)
+            _check_budget(estimate, memory_budget, f"A {num_wires}-wire {name} execution")
+
+            log["tapes"] += 1
+            log["operations"] += len(tape.operations)
+            if log["largest_tape"] is None or len(tape.operations) > len(log["largest_tape"].operations):
+                log["largest_tape"] = tape
+        return execute(circuits, *args, **kwargs)
+
+    setattr(dev, method_name, guarded)
+
+
+@contextlib.contextmanager
+def simulation_settings(precision="double", memory_budget=None, substitute=False):
+    """
+    Makes qml.device create simulators in the given precision and within a memory budget while the context is active.
+
+    The challenges look up qml.device when they create their devices, at import for module-level
+    devices and at call time otherwise, so loading and running a challenge inside the context is enough.
+
+    The memory needed is estimated when a device with explicit wires is created, before any state is
+    allocated, and again for every execution, where the wires of the tape and broadcasting are known.
+
+    Args:
+        - precision (str): "double" leaves the devices alone, "single" applies SINGLE_PRECISION_DEVICES.
+        - memory_budget (int): The largest estimated peak memory in bytes, or None for no limit.
+        - substitute (bool): Whether double precision also swaps the devices of SINGLE_PRECISION_DEVICES,
+        keeping their dtypes at DOUBLE_DTYPES, so that only the precision differs from a single run.
+    Yields:
+        - dict: Filled with "devices", a "requested -> used (dtype)" entry for every device created,
+        "kept_double", the names of the devices left in complex128 by single precision, since the
+        substitutes need explicit wires,
+        "estimated_bytes", the largest estimate so far, "tapes" and "operations", the numbers of tapes
+        and operations executed, and "largest_tape", the executed tape with the most operations after
+        device preprocessing.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+
+    log = {"devices": [], "kept_double": [], "estimated_bytes": 0, "tapes": 0, "operations": 0, "largest_tape": None}
+    original = qml.device
+
+    def device(name, *args, **kwargs):
+        wires = args[0] if args else kwargs.get("wires")
+        used, extra = name, {}
+        if (precision == "single" or substitute) and wires is not None:
+            used, extra = SINGLE_PRECISION_DEVICES.get(name, (name, {}))
+            if precision == "double":
+                extra = {key: DOUBLE_DTYPES[key] for key in extra}
+        c_dtype = extra.get("c_dtype", kwargs.get("c_dtype", onp.complex128))
+        log["devices"].append(f"{name} -> {used} ({c_dtype.__name__})")
+        if precision == "single" and c_dtype == onp.complex128:
+            log["kept_double"].append(name)
+
+        if wires is not None:
+            num_wires = wires if isinstance(wires, int) else len(qml.wires.Wires(wires))
+            estimate = estimate_simulation_bytes(used, num_wires, c_dtype=c_dtype)
+            log["estimated_bytes"] = max(log["estimated_bytes"], estimate)
+            _check_budget(estimate, memory_budget, f"A {num_wires}-wire {used} device")
+
+        dev = original(used, *args, **{**extra, **kwargs})
+        _guard_execution(dev, used, c_dtype, memory_budget, log)
+        return dev
+
+    qml.device = device
+    try:
+        yield log
+    finally:
+        qml.device = original
+
+
+def construct_tape(qfunc, *args, expand_depth=0, **kwargs):
+    """
+    Builds the tape of a quantum function without creating a device or simulating anything.
+
+    Args:
+        - qfunc (callable): The quantum function, or a QNode whose function is used.
+        - args: The arguments of the quantum function.
+        - expand_depth (int): How many times the operations without native support are decomposed.
+        - kwargs: The keyword arguments of the quantum function.
+    Returns:
+        - QuantumScript: The tape.
+    """
+    tape = qml.tape.make_qscript(getattr(qfunc, "func", qfunc))(*args, **kwargs)
+    return tape.expand(depth=expand_depth) if expand_depth else tape
+
+
+def resource_summary(tape):
+    """
+    Summarises the size of a circuit.
+
+    Args:
+        - tape (QuantumScript): The circuit.
+    Returns:
+        - dict: The keys "num_wires", "num_gates", "depth", "two_qubit_gates" and "gate_types",
+        the number of operations of each name.
+    """
+    resources = tape.specs["resources"]
+    return {
+        "num_wires": resources.num_wires,
+        "num_gates": resources.num_gates,
+        "depth": resources.depth,
+        "two_qubit_gates": resources.gate_sizes.get(2, 0),
+        "gate_types": dict(resources.gate_types),
+    }
+
+
+def challenge_names():
+    """Names like "BosonBeach/500" of every challenge script."""
+    paths = sorted(glob.glob(os.path.join(CHALLENGE_DIR, "*", "[0-9]*.py")))
+    return [os.path.relpath(p, CHALLENGE_DIR)[:-3].replace(os.sep, "/") for p in paths]
+
+
+def load_challenge(name):
+    """
+    Imports a challenge script without running its public test cases.
+
+    The module is registered in sys.modules so that the process pools some challenges use can pickle
+    its functions.
+
+    Args:
+        - name (str): The challenge, like "BosonBeach/500".
+    Returns:
+        - module: The challenge module.
+    """
+    path = os.path.join(CHALLENGE_DIR, *name.split("/")) + ".py"
+    with open(path) as f:
+        source = f.read()
+    source = source.split(TEST_LOOP_MARKER)[0]
+
+    module = types.ModuleType("challenge_" + name.replace("/", "_"))
+    module.__file__ = path
+    sys.modules[module.__name__] = module
+    exec(compile(source, path, "exec"), module.__dict__)
+
+    return module
+
+
+def _parse(output):
+    try:
+        return onp.asarray(json.loads(output), dtype=float)
+    except (TypeError, ValueError):
+        return None
+
+
+def max_deviation(output, reference):
+    """Largest absolute difference between two numeric outputs, or None if they are not comparable."""
+    output, reference = _parse(output), _parse(reference)
+    if output is None or reference is None or output.shape != reference.shape:
+        return None
+    return float(onp.max(onp.abs(output - reference), initial=0.0))
+
+
+def run_test_case(module, input_, expected_output):
+    """
+    Runs and checks one public test case.
+
+    Args:
+        - module (module): The challenge module.
+        - input_ (str): The test case input.
+        - expected_output (str): The expected output.
+    Returns:
+        - dict: The keys "input", "output", "status" ("Correct", "Wrong Answer", "Runtime Error" or
+        "Memory Limit Exceeded"), "error" and "seconds", the time taken by run().
+    """
+    row = {"input": input_, "output": None, "status": "Correct", "error": None, "seconds": None}
+
+    start = time.perf_counter()
+    try:
+        row["output"] = module.run(input_)
+    except MemoryBudgetExceeded as exc:
+        row.update(status="Memory Limit Exceeded", error=str(exc))
+        return row
+    except Exception as exc:
+        row.update(status="Runtime Error", error=str(exc))
+        return row
+    row["seconds"] = time.perf_counter() - start
+
+    try:
+        module.check(row["output"], expected_output)
+    except AssertionError as exc:
+        row.update(status="Wrong Answer", error=str(exc))
+    except MemoryBudgetExceeded as exc:
+        row.update(status="Memory Limit Exceeded", error=str(exc))
+    except Exception as exc:
+        row.update(status="Runtime Error", error=str(exc))
+
+    return row
+
+
+def run_challenge(name, precision="double", memory_budget=DEFAULT_MEMORY_BUDGET, resources=False, substitute=False):
+    """
+    Loads a challenge and runs all its public test cases in the given precision.
+
+    Args:
+        - name (str): The challenge, like "BosonBeach/500".
+        - precision (str): "double" or "single".
+        - memory_budget (int): The memory budget in bytes, see simulation_settings.
+        - resources (bool): Whether to summarise the largest circuit executed by each case.
+        - substitute (bool): Whether double precision runs on the single-precision simulators, see
+        simulation_settings.
+    Returns:
+        - list(dict): One row per test case, as from run_test_case, plus "challenge", "case", "precision",
+        "devices", the devices created so far, "downgraded", whether the case ran in single precision
+        with every device in complex64, "estimated_bytes", the largest memory estimate of the
+        case, counting the devices created when the module was loaded, and "tapes", the number of tapes
+        executed. With resources, "resources" has the resource_summary of the largest of those tapes.
+        A challenge that fails to load gives a single "Load Error" row.
+    """
+    precision = PINNED_PRECISION.get(name, precision)
+
+    with simulation_settings(precision, memory_budget, substitute) as log:
+        try:
+            module = load_challenge(name)
+        except Exception as exc:
+            return [{"challenge": name, "case": None, "precision": precision, "status": "Load Error", "error": str(exc)}]
+        load_estimate = log["estimated_bytes"]
+
+        rows = []
+        for case, (input_, expected_output) in enumerate(module.test_cases):
+            log.update(estimated_bytes=load_estimate, tapes=0, operations=0, largest_tape=None)
+            row = run_test_case(module, input_, expected_output)
+            row = {
+                "challenge": name, "case": case, "precision": precision, **row,
+                "devices": sorted(set(log["devices"])), "downgraded": precision == "single" and not log["kept_double"],
+                "estimated_bytes": log["estimated_bytes"], "tapes": log["tapes"],
+            }
+            if resources and log["largest_tape"] is not None:
+                row["resources"] = resource_summary(log["largest_tape"])
+            rows.append(row)
+
+    return rows
+
+
+def compare_precisions(name, memory_budget=DEFAULT_MEMORY_BUDGET, resources=False):
+    """
+    Runs the public test cases of a challenge in double and in single precision, on the same simulators.
+
+    Args:
+        - name (str): The challenge, like "BosonBeach/500".
+        - memory_budget (int): The memory budget in bytes, see simulation_settings.
+        - resources (bool): Whether to summarise the largest circuit executed by each case.
+    Returns:
+        - list(dict): The rows of both runs, where every downgraded single-precision row also has
+        "speedup", the ratio of the double to the single run() time, and "max_deviation" from the double
+        output. Challenges pinned to double precision are only run once.
+    """
+    if PINNED_PRECISION.get(name, "single") == "double":
+        return run_challenge(name, "double", memory_budget, resources)
+    double_rows = run_challenge(name, "double", memory_budget, resources, substitute=True)
+    single_rows = run_challenge(name, "single", memory_budget, resources)
+
+    for double, single in zip(double_rows, single_rows):
+        if not single.get("downgraded"):
+            continue
+        if double.get("seconds") and single.get("seconds"):
+            single["speedup"] = double["seconds"] / single["seconds"]
+        if double.get("output") is not None and single.get("output") is not None:
+            single["max_deviation"] = max_deviation(single["output"], double["output"])
+
+    return double_rows + single_rows
+
+
+def _format_bytes(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.3g} {unit}"
+        size /= 1024
+
+
+def _describe(row):
+    text = f"{row['challenge']} case {row['case']} [{row['precision']}]: {row['status']}"
+    if row.get("seconds") is not None:
+        text += f" in {row['seconds']:.3f} s"
+    if row.get("estimated_bytes"):
+        text += f", ~{_format_bytes(row['estimated_bytes'])}"
+    if row["precision"] == "single" and row.get("downgraded") is False:
+        text += ", not downgraded"
+    if row.get("speedup") is not None:
+        text += f", x{row['speedup']:.2f} vs double"
+    if row.get("max_deviation") is not None:
+        text += f", max deviation {row['max_deviation']:.2e}"
+    if row.get("resources"):
+        summary = row["resources"]
+        text += (
+            f", largest of {row['tapes']} tapes: {summary['num_gates']} gates on {summary['num_wires']} wires,"
+            f" depth {summary['depth']}, {summary['two_qubit_gates']} two-qubit"
+        )
+    if row.get("error"):
+        text += f" ({row['error']})"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the public test cases of the challenges.")
+    parser.add_argument("challenges", nargs="*", help='challenges like "BosonBeach/500[:single]", all by default')
+    parser.add_argument("--precision", choices=PRECISIONS + ("compare",), default="double")
+    parser.add_argument(
+        "--memory-budget", type=float, default=DEFAULT_MEMORY_BUDGET / 2**30,
+        help="largest estimated simulator memory in GiB, 0 for no limit",
+    )
+    parser.add_argument("--resources", action="store_true", help="summarise the largest circuit of every case")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+    memory_budget = int(args.memory_budget * 2**30) or None
+
+    rows = []
+    for spec in args.challenges or challenge_names():
+        name, _, precision = spec.partition(":")
+        precision = precision or args.precision
+        if precision == "compare":
+            rows += compare_precisions(name, memory_budget, args.resources)
+        else:
+            rows += run_challenge(name, precision, memory_budget, args.resources)
+
+    for row in rows:
+        print(_describe(row))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cases": rows}, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()